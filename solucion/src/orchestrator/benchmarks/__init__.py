@@ -0,0 +1,13 @@
+import os
+
+# Benchmarks run offline against local stand-ins, but GoogleAPI reads the
+# Google settings when it is created.
+for _name in (
+    "GOOGLE_API_HOST",
+    "GOOGLE_API_KEY",
+    "GOOGLE_CX",
+    "GOOGLE_FIELDS",
+    "HEADER_ACCEPT_ENCODING",
+    "HEADER_USER_AGENT",
+):
+    os.environ.setdefault(_name, "")
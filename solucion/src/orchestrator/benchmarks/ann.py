@@ -0,0 +1,87 @@
+"""Measures recall@10 and query latency of VectorIndex against brute-force
+NumPy search on clustered synthetic vectors.
+
+1M vectors at the real 1536 dimensions need about 6 GB, so the default
+dimension is smaller; pass --dimension 1536 on a machine that can hold it.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.ann
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from retrieval.index import VectorIndex
+from retrieval.ranking import normalize, top_k
+
+
+def make_vectors(n: int, dimension: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    labels = rng.integers(0, clusters, n)
+    noise = rng.standard_normal((n, dimension), dtype=np.float32)
+    return normalize(centers[labels] + noise * 0.6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--dimension", type=int, default=64)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--probes", type=int, nargs="+", default=[4, 16])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        f"{'vectors':>9} {'method':>10} {'recall@k':>9} {'ms/query':>9}"
+        f" {'build (s)':>10} {'memory (MB)':>12}"
+    )
+    for n in args.sizes:
+        vectors = make_vectors(n, args.dimension, clusters=max(16, n // 500), rng=rng)
+        queries = (
+            vectors[rng.integers(0, n, args.queries)]
+            + rng.standard_normal((args.queries, args.dimension), dtype=np.float32)
+            * 0.1
+        )
+
+        start = time.perf_counter()
+        truth = [
+            set(top_k(query, vectors, args.k, normalized=True)[0]) for query in queries
+        ]
+        brute_ms = (time.perf_counter() - start) / args.queries * 1000
+        print(
+            f"{n:>9} {'brute':>10} {1.0:>9.3f} {brute_ms:>9.3f}"
+            f" {0.0:>10.2f} {vectors.nbytes / 2**20:>12.1f}"
+        )
+
+        start = time.perf_counter()
+        index = VectorIndex(dimension=args.dimension)
+        index.insert(vectors, [""] * n, [str(i) for i in range(n)])
+        build = time.perf_counter() - start
+
+        for probes in args.probes:
+            index.probes = probes
+            start = time.perf_counter()
+            results = [index.search(query, args.k) for query in queries]
+            ivf_ms = (time.perf_counter() - start) / args.queries * 1000
+
+            recall = np.mean(
+                [
+                    len(truth_ids & {int(url) for url in found.urls}) / args.k
+                    for truth_ids, found in zip(truth, results)
+                ]
+            )
+            print(
+                f"{n:>9} {f'ivf p={probes}':>10} {recall:>9.3f} {ivf_ms:>9.3f}"
+                f" {build:>10.2f} {index.memory_bytes()['total'] / 2**20:>12.1f}"
+            )
+        del index
+
+
+if __name__ == "__main__":
+    main()
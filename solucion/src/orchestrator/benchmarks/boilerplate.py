@@ -0,0 +1,78 @@
+"""Reports how much main-content extraction cuts chunk counts and how much of
+the full-text retrieval it keeps, on generated news-style fixtures.
+
+For every topic a query is ranked against the chunks of all fixture pages with
+both extraction modes. "top-k kept" is the share of the chunks retrieved from
+the full text whose sentences mostly survive in the main-content text; chunk
+boundaries differ between modes, so whole chunks rarely match verbatim. Misses
+are often banner or footer chunks that the full text ranked highly. "shared"
+is the share of the main-content top-k that overlaps the full-text top-k.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.boilerplate
+"""
+
+import argparse
+import asyncio
+
+from benchmarks.standins import TOPICS, LexicalEmbeddings, make_article_page
+from retrieval.extract import extract_text
+from retrieval.ranking import to_matrix, top_k
+from retrieval.splitter import LangChainSplitter
+
+
+async def top_chunks(query: str, chunks: list[str], embeddings, k: int) -> list[str]:
+    query_vector = await embeddings.run([query])
+    vectors = await embeddings.run(chunks)
+    indices, _ = top_k(query_vector, to_matrix(vectors), k)
+    return [chunks[i] for i in indices]
+
+
+def survives(chunk: str, text: str) -> bool:
+    sentences = [sentence for sentence in chunk.split(". ") if sentence]
+    found = sum(sentence in text for sentence in sentences)
+    return found >= len(sentences) / 2
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages-per-topic", type=int, default=3)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    splitter = LangChainSplitter(chunk_size=400, chunk_overlap=50, length_function=len)
+    embeddings = LexicalEmbeddings()
+
+    pages = [
+        make_article_page(topic, seed=seed)
+        for topic in TOPICS
+        for seed in range(args.pages_per_topic)
+    ]
+
+    texts, chunks = {}, {}
+    for mode in ("full", "main"):
+        texts[mode] = [extract_text(page.encode(), extraction=mode) for page in pages]
+        chunks[mode] = [
+            chunk for text in texts[mode] for chunk in await splitter.split(text)
+        ]
+
+    full, main_ = len(chunks["full"]), len(chunks["main"])
+    print(f"chunks: full {full}, main {main_} ({1 - main_ / full:.1%} fewer)")
+
+    main_text = "\n".join(texts["main"])
+    for topic in TOPICS:
+        retrieved = await top_chunks(topic, chunks["full"], embeddings, args.k)
+        kept = sum(survives(chunk, main_text) for chunk in retrieved) / len(retrieved)
+
+        retrieved_main = await top_chunks(topic, chunks["main"], embeddings, args.k)
+        full_top = "\n".join(retrieved)
+        shared = sum(survives(chunk, full_top) for chunk in retrieved_main)
+        print(
+            f"{topic:>12}: top-{args.k} kept {kept:.0%},"
+            f" shared {shared / len(retrieved_main):.0%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
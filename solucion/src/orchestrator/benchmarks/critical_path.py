@@ -0,0 +1,142 @@
+"""Regression check for the start of get_context: without a semantic cache the
+query embedding and the search must overlap, and scraping must not wait for
+the query vector. With a cache, a hit must not search, scrape or embed chunks.
+
+Latency is injected into every stand-in. If the calls ran in series, the
+search event would arrive after embed + search and the context after
+embed + search + page + embed; with the dependency graph they arrive after
+max(embed, search) and search + page + embed. The time the same run takes
+with no injected latency (parsing, splitting, local HTTP) is added to both
+bounds. Exits with status 1 when a median is closer to the serial bound
+than to the concurrent one, or when a cache hit did more than embed the
+query.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.critical_path
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.standins import FakeSearcher, HashEmbeddings, LocalSite
+from retrieval import Retriever
+from retrieval.cache import SemanticCache
+from retrieval.scraper import ScraperLocal
+from retrieval.splitter import RecursiveSplitter
+from util.http_client import HttpClients
+
+
+async def measure(
+    site: LocalSite, args, embed_delay: float, search_delay: float
+) -> dict[str, float]:
+    splitter = RecursiveSplitter(chunk_size=400, chunk_overlap=50)
+    links = [f"{site.base_url}/pages/{i}" for i in range(args.links)]
+    times: dict[str, list[float]] = {"search": [], "context": []}
+    try:
+        async with HttpClients(limit_per_host=0) as http:
+            retriever = Retriever(
+                searcher=FakeSearcher(links, delay=search_delay),
+                scraper=ScraperLocal(http=http),
+                embeddings=HashEmbeddings(dimension=64, delay=embed_delay),
+                splitter=splitter,
+            )
+            for number in range(args.repeat + 1):
+                start = time.perf_counter()
+                async for event in retriever.get_context(
+                    f"question {number}", cache_treshold=2.0
+                ):
+                    if event["event"] in times and number:
+                        times[event["event"]].append(time.perf_counter() - start)
+    finally:
+        splitter.close()
+    return {event: statistics.median(values) for event, values in times.items()}
+
+
+async def cache_hit(site: LocalSite, args) -> dict[str, int]:
+    """Work done by the second of two identical questions."""
+
+    splitter = RecursiveSplitter(chunk_size=400, chunk_overlap=50)
+    links = [f"{site.base_url}/pages/{i}" for i in range(args.links)]
+    searcher = FakeSearcher(links, delay=args.search_delay)
+    # Slower than the search, so a search started early would be caught.
+    embeddings = HashEmbeddings(dimension=64, delay=args.search_delay * 2)
+    try:
+        async with HttpClients(limit_per_host=0) as http:
+            retriever = Retriever(
+                searcher=searcher,
+                scraper=ScraperLocal(http=http),
+                embeddings=embeddings,
+                splitter=splitter,
+                cache=SemanticCache(),
+            )
+            counts = []
+            for _ in range(2):
+                counts.append((searcher.calls, site.requests, embeddings.calls))
+                # Any cached set is close enough: the first question misses on
+                # the empty cache and the second one hits.
+                async for _ in retriever.get_context("question", cache_treshold=-1.0):
+                    pass
+            # Tasks the hit left running would still count after a pause.
+            await asyncio.sleep(args.page_delay * 2)
+    finally:
+        splitter.close()
+    after = (searcher.calls, site.requests, embeddings.calls)
+    return {
+        name: after[i] - counts[1][i]
+        for i, name in enumerate(("searches", "pages", "embeddings"))
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--embed-delay", type=float, default=0.15)
+    parser.add_argument("--search-delay", type=float, default=0.3)
+    parser.add_argument("--page-delay", type=float, default=0.2)
+    parser.add_argument("--links", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    embed, search, page = args.embed_delay, args.search_delay, args.page_delay
+    bounds = {
+        "search": (max(embed, search), embed + search),
+        "context": (search + page + embed, embed + search + page + embed),
+    }
+
+    failed = False
+    sizes = (20_000, 20_000)
+    async with LocalSite(pages=args.links, page_sizes=sizes) as fast, LocalSite(
+        pages=args.links, page_sizes=sizes, latency=(page, page)
+    ) as site:
+        print(
+            f"{'event':>8} {'median (s)':>11} {'concurrent (s)':>15} {'serial (s)':>11}"
+        )
+        overhead = await measure(fast, args, 0.0, 0.0)
+        times = await measure(site, args, embed, search)
+        for event, (concurrent, serial) in bounds.items():
+            median = times[event]
+            concurrent += overhead[event]
+            serial += overhead[event]
+            regressed = median - concurrent > serial - median
+            failed |= regressed
+            print(
+                f"{event:>8} {median:>11.3f} {concurrent:>15.3f} {serial:>11.3f}"
+                + ("  REGRESSION" if regressed else "")
+            )
+
+        work = await cache_hit(site, args)
+        regressed = work != {"searches": 0, "pages": 0, "embeddings": 1}
+        failed |= regressed
+        print(
+            f"\ncache hit: {work['searches']} searches, {work['pages']} pages,"
+            f" {work['embeddings']} embeddings" + ("  REGRESSION" if regressed else "")
+        )
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
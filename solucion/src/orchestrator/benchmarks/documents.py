@@ -0,0 +1,127 @@
+"""Compares the memory and time of carrying chunks as DocumentBatch columns
+against the former per-chunk dicts and pydantic Documents, from the
+embedding responses of every page to the top-k selection and the semantic
+cache entry.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.documents
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+import numpy as np
+
+from models.document import Document, DocumentBatch
+from retrieval.cache import SemanticCache
+from retrieval.ranking import normalize, to_matrix, top_k
+
+
+def make_pages(candidates: int, per_page: int, dimension: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    pages = []
+    for start in range(0, candidates, per_page):
+        count = min(per_page, candidates - start)
+        pages.append(
+            (
+                [f"chunk {start + i} " * 20 for i in range(count)],
+                f"https://example.com/{start // per_page}",
+                rng.standard_normal((count, dimension)),
+            )
+        )
+    return pages, rng.standard_normal(dimension).tolist()
+
+
+def responses(pages):
+    """Fresh embedding responses, decoded as the API returns them: lists of
+    Python floats that live as long as something references them."""
+
+    for texts, url, vectors in pages:
+        yield texts, url, vectors.tolist()
+
+
+def legacy_path(pages, query_vector, k: int):
+    data = [
+        {"text": text, "url": url, "vector": vector}
+        for texts, url, vectors in responses(pages)
+        for text, vector in zip(texts, vectors)
+    ]
+    matrix = to_matrix([doc["vector"] for doc in data])
+    indices, scores = top_k(query_vector, matrix, k)
+    documents = [
+        Document(
+            text=data[i]["text"],
+            url=data[i]["url"],
+            vector=data[i]["vector"],
+            similarity=float(score),
+        )
+        for i, score in zip(indices, scores)
+    ]
+    cached = normalize(to_matrix([doc.vector for doc in documents]))
+    return data, documents, cached
+
+
+def batch_path(pages, query_vector, k: int, cache: SemanticCache):
+    batch = DocumentBatch.concat(
+        [
+            DocumentBatch(vectors, texts, [url] * len(texts))
+            for texts, url, vectors in responses(pages)
+        ]
+    )
+    indices, scores = top_k(query_vector, batch.vectors, k)
+    selected = batch.take(indices, scores)
+    cache.add(query_vector, selected)
+    return batch, selected
+
+
+def measure(fn, repeat: int):
+    """Best wall time, the memory still held by the candidates and selection
+    the path keeps for the rest of the query, and the peak reached."""
+
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best, held, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--candidates", type=int, default=500)
+    parser.add_argument("--per-page", type=int, default=50)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    pages, query_vector = make_pages(args.candidates, args.per_page, args.dimension)
+
+    legacy = measure(lambda: legacy_path(pages, query_vector, args.k), args.repeat)
+    batch = measure(
+        lambda: batch_path(pages, query_vector, args.k, SemanticCache()), args.repeat
+    )
+
+    print(
+        f"{args.candidates} candidates, k={args.k}, dimension {args.dimension}\n"
+        f"{'path':>8} {'time (ms)':>10} {'held (MB)':>10} {'peak (MB)':>10}"
+    )
+    for name, (seconds, held, peak) in [("legacy", legacy), ("batch", batch)]:
+        print(
+            f"{name:>8} {seconds * 1000:>10.2f} {held / 2**20:>10.2f}"
+            f" {peak / 2**20:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
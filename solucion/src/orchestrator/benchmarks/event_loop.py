@@ -0,0 +1,99 @@
+"""Measures event-loop lag and throughput of N concurrent get_context calls
+with HTML parsing inline, in a thread pool or in a process pool.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.event_loop --concurrency 8
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Optional
+
+from benchmarks.standins import HashEmbeddings, LocalSite
+from retrieval import Retriever
+from retrieval.scraper import ScraperLocal
+from retrieval.search import GoogleAPI
+from retrieval.splitter import LangChainSplitter
+from util.executor import BoundedExecutor
+from util.http_client import HttpClients
+
+
+async def monitor_lag(lags: list[float], stop: asyncio.Event, interval: float = 0.01):
+    """Records how late a periodic timer fires, which is the time other
+    coroutines had to wait for the loop."""
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def run(site: LocalSite, executor: Optional[BoundedExecutor], args) -> dict:
+    async with HttpClients(limit_per_host=0) as http:
+        retriever = Retriever(
+            searcher=GoogleAPI(http=http, host=f"{site.base_url}/search?"),
+            scraper=ScraperLocal(http=http, executor=executor),
+            embeddings=HashEmbeddings(dimension=32, delay=0.05),
+            splitter=LangChainSplitter(
+                chunk_size=400, chunk_overlap=50, length_function=len
+            ),
+        )
+
+        async def question(number: int):
+            async for _ in retriever.get_context(f"question {number}", k=10):
+                pass
+
+        # Warm up the pool so worker start-up is not part of the measurement.
+        await question(-1)
+
+        lags: list[float] = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(monitor_lag(lags, stop))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(question(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+        stop.set()
+        await monitor
+
+    lags.sort()
+    return {
+        "seconds": elapsed,
+        "queries_per_second": args.concurrency / elapsed,
+        "lag_p99_ms": lags[int(len(lags) * 0.99)] * 1000 if lags else 0.0,
+        "lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--page-size", type=int, default=300_000)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    async with LocalSite(page_sizes=(args.page_size, args.page_size)) as site:
+        print(
+            f"{'parser':>8} {'time (s)':>9} {'queries/s':>10}"
+            f" {'lag p99 (ms)':>13} {'lag max (ms)':>13}"
+        )
+        for kind in ("inline", "thread", "process"):
+            executor = None
+            if kind != "inline":
+                executor = BoundedExecutor(kind=kind, max_workers=args.workers)
+            try:
+                result = await run(site, executor, args)
+            finally:
+                if executor is not None:
+                    executor.shutdown()
+            print(
+                f"{kind:>8} {result['seconds']:>9.2f} {result['queries_per_second']:>10.2f}"
+                f" {result['lag_p99_ms']:>13.1f} {result['lag_max_ms']:>13.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+"""Compares the BeautifulSoup parser with the streaming extractor on large
+generated pages. Every measurement runs in a fresh process so that peak RSS
+is not shared between runs.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.extraction
+"""
+
+import argparse
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.standins import make_page
+from retrieval.extract import StreamingTextExtractor, soup_text
+
+
+def measure(mode: str, size: int, max_bytes: int, max_chars) -> dict:
+    body = make_page(size).encode("utf-8")
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    start = time.perf_counter()
+    if mode == "soup":
+        text = soup_text(body.decode("utf-8"))
+    else:
+        if mode == "unbounded":
+            max_bytes, max_chars = len(body), None
+        # Same loop as Scraper.parse_stream, fed from memory in 64 KiB chunks.
+        extractor = StreamingTextExtractor(max_chars=max_chars)
+        received = 0
+        for offset in range(0, min(len(body), max_bytes), 64 * 1024):
+            chunk = body[offset : min(offset + 64 * 1024, max_bytes)]
+            received += len(chunk)
+            extractor.feed(chunk.decode("utf-8", errors="replace"))
+            if extractor.done:
+                break
+        extractor.close()
+        text = extractor.text()
+    elapsed = time.perf_counter() - start
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"seconds": elapsed, "rss_kib": peak - baseline, "chars": len(text)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000_000, 5_000_000, 20_000_000]
+    )
+    parser.add_argument("--max-bytes", type=int, default=2_000_000)
+    parser.add_argument("--max-chars", type=int, default=200_000)
+    args = parser.parse_args()
+
+    print(
+        f"{'size':>10} {'mode':>10} {'time (ms)':>10} {'peak RSS +KiB':>14} {'chars':>9}"
+    )
+    # "unbounded" runs the streaming extractor without byte or text budget.
+    for size in args.sizes:
+        for mode in ("soup", "unbounded", "streaming"):
+            with ProcessPoolExecutor(max_workers=1) as pool:
+                result = pool.submit(
+                    measure, mode, size, args.max_bytes, args.max_chars
+                ).result()
+            print(
+                f"{size:>10} {mode:>10} {result['seconds'] * 1000:>10.1f}"
+                f" {result['rss_kib']:>14} {result['chars']:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
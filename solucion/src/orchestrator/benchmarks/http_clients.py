@@ -0,0 +1,78 @@
+"""Compares searcher and scraper latency with a session per call against the
+shared HttpClients registry, using the LocalSite stand-in.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.http_clients
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Optional
+
+from benchmarks.standins import LocalSite
+from retrieval.scraper import ScraperLocal
+from retrieval.search import GoogleAPI
+from util.http_client import HttpClients
+
+
+async def one_question(
+    searcher: GoogleAPI, scraper: ScraperLocal
+) -> tuple[float, float]:
+    start = time.perf_counter()
+    results = await searcher.run("langchain")
+    searched = time.perf_counter()
+    await asyncio.gather(*(scraper.fetch(item.link) for item in results.items))
+    return searched - start, time.perf_counter() - searched
+
+
+async def run(
+    site: LocalSite, http: Optional[HttpClients], questions: int, concurrency: int
+) -> dict[str, list[float]]:
+    searcher = GoogleAPI(http=http, host=f"{site.base_url}/search?")
+    scraper = ScraperLocal(http=http)
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: dict[str, list[float]] = {"search": [], "scrape": []}
+
+    async def question():
+        async with semaphore:
+            search_time, scrape_time = await one_question(searcher, scraper)
+            timings["search"].append(search_time)
+            timings["scrape"].append(scrape_time)
+
+    await asyncio.gather(*(question() for _ in range(questions)))
+    return timings
+
+
+def describe(values: list[float]) -> str:
+    values = sorted(values)
+    p95 = values[min(len(values) - 1, int(len(values) * 0.95))]
+    return f"mean {statistics.mean(values) * 1000:7.2f} ms  p95 {p95 * 1000:7.2f} ms"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=2_000)
+    # Every stand-in URL shares one host, so the production per-host cap would
+    # only measure queueing.
+    parser.add_argument("--limit-per-host", type=int, default=0)
+    args = parser.parse_args()
+
+    async with LocalSite(page_sizes=(args.page_size, args.page_size)) as site:
+        per_call = await run(site, None, args.questions, args.concurrency)
+
+        async with HttpClients(limit_per_host=args.limit_per_host) as http:
+            shared = await run(site, http, args.questions, args.concurrency)
+
+    for name, timings in (("per-call sessions", per_call), ("shared clients", shared)):
+        print(name)
+        for stage, values in timings.items():
+            print(f"  {stage:<7} {describe(values)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,77 @@
+"""Compares N concurrent answers streamed by a blocking client, like the former
+stream_chat, against the async ChatModel, using the FakeChat stand-in.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.llm_stream --concurrency 10
+"""
+
+import argparse
+import asyncio
+import time
+from typing import AsyncIterator, Iterator
+
+from benchmarks.standins import FakeChat
+from llm.chat import ChatModel
+
+
+class BlockingFakeChat(ChatModel):
+    """Same token schedule as FakeChat, read from a synchronous iterator inside
+    the event loop the way stream_chat consumed openai.ChatCompletion.create."""
+
+    def __init__(self, fake: FakeChat) -> None:
+        self.fake = fake
+
+    def tokens(self) -> Iterator[str]:
+        time.sleep(self.fake.first_token_delay)
+        for i in range(self.fake.tokens):
+            if i:
+                time.sleep(1 / self.fake.tokens_per_second)
+            yield "token "
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        for token in self.tokens():
+            yield token
+
+
+async def run(chat: ChatModel, concurrency: int) -> dict:
+    first_tokens: list[float] = []
+    start = time.perf_counter()
+
+    async def answer():
+        count = 0
+        async for _ in chat.stream("question"):
+            if count == 0:
+                first_tokens.append(time.perf_counter() - start)
+            count += 1
+        return count
+
+    tokens = sum(await asyncio.gather(*(answer() for _ in range(concurrency))))
+    elapsed = time.perf_counter() - start
+    return {
+        "seconds": elapsed,
+        "tokens_per_second": tokens / elapsed,
+        "worst_first_token": max(first_tokens),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--tokens", type=int, default=100)
+    parser.add_argument("--rate", type=float, default=100.0)
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    args = parser.parse_args()
+
+    fake = FakeChat(args.tokens, args.rate, args.first_token_delay)
+    print(f"{'client':>8} {'time (s)':>9} {'tokens/s':>9} {'worst TTFT (s)':>15}")
+    for name, chat in (("blocking", BlockingFakeChat(fake)), ("async", fake)):
+        result = await run(chat, args.concurrency)
+        print(
+            f"{name:>8} {result['seconds']:>9.2f} {result['tokens_per_second']:>9.1f}"
+            f" {result['worst_first_token']:>15.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,113 @@
+"""Compares ScraperRemote sending one request per url with the batch protocol.
+
+Concurrent questions run against LocalScraperService, which scrapes a
+LocalSite with injected latency. For each mode the script reports the
+requests the service received per question, the question latency and the
+throughput. Batched calls from concurrent questions share requests, so the
+request count drops well below the number of links.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.remote_scraper --queries 32 --concurrency 8
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+
+from benchmarks.standins import (
+    FakeSearcher,
+    HashEmbeddings,
+    LocalScraperService,
+    LocalSite,
+)
+from retrieval import Retriever
+from retrieval.scraper import ScraperRemote
+from retrieval.splitter import RecursiveSplitter
+from util.http_client import HttpClients
+
+
+async def run(site: LocalSite, service: LocalScraperService, args, batch: bool):
+    splitter = RecursiveSplitter(chunk_size=400, chunk_overlap=50)
+    links = [f"{site.base_url}/pages/{i}" for i in range(args.links)]
+    try:
+        async with HttpClients(limit_per_host=0) as http:
+            scraper = ScraperRemote(
+                host=f"{service.base_url}/scrape/?url=",
+                http=http,
+                hedge_percentile=None,
+                batch_url=f"{service.base_url}/scrape/batch" if batch else None,
+            )
+            retriever = Retriever(
+                searcher=FakeSearcher(links),
+                scraper=scraper,
+                embeddings=HashEmbeddings(dimension=64),
+                splitter=splitter,
+            )
+            slots = asyncio.Semaphore(args.concurrency)
+            totals: list[float] = []
+
+            async def question(number: int):
+                async with slots:
+                    start = time.perf_counter()
+                    async for _ in retriever.get_context(f"question {number}"):
+                        pass
+                    totals.append(time.perf_counter() - start)
+
+            await question(-1)
+            totals.clear()
+            requests = service.requests
+
+            start = time.perf_counter()
+            await asyncio.gather(*(question(i) for i in range(args.queries)))
+            elapsed = time.perf_counter() - start
+    finally:
+        splitter.close()
+
+    p50, p95 = np.percentile(np.asarray(totals) * 1000, (50, 95))
+    return {
+        "requests_per_query": (service.requests - requests) / args.queries,
+        "queries_per_second": args.queries / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--links", type=int, default=5)
+    parser.add_argument("--page-sizes", type=int, nargs=2, default=[20_000, 200_000])
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.02, 0.3])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async with LocalSite(
+        pages=args.links,
+        page_sizes=tuple(args.page_sizes),
+        latency=tuple(args.latency),
+        seed=args.seed,
+        distribution="lognormal",
+    ) as site, LocalScraperService() as service:
+        print(
+            f"{'mode':>7} {'requests/query':>15} {'queries/s':>10}"
+            f" {'p50 (ms)':>9} {'p95 (ms)':>9}"
+        )
+        for batch in (False, True):
+            # Both modes see the same latencies.
+            site.rng = random.Random(args.seed)
+            result = await run(site, service, args, batch)
+            print(
+                f"{'batch' if batch else 'single':>7}"
+                f" {result['requests_per_query']:>15.2f}"
+                f" {result['queries_per_second']:>10.2f}"
+                f" {result['p50_ms']:>9.1f} {result['p95_ms']:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,221 @@
+"""Drives concurrent Retriever.get_context calls against local stand-ins and
+reports per-stage latency percentiles, throughput and peak RSS.
+
+Google is replaced by FakeSearcher, the scraped sites by LocalSite and OpenAI
+by HashEmbeddings, so runs need no network and are repeatable. Stage times
+come from the tracing spans of every query. Results are written as JSON,
+tagged with the current commit, and can be compared with an earlier run.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.retriever --queries 32 --concurrency 8
+    python -m benchmarks.retriever --baseline .cache/benchmarks/<earlier>.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import numpy as np
+
+from benchmarks.standins import FakeSearcher, HashEmbeddings, LocalSite
+from retrieval import Retriever
+from retrieval.cache import SemanticCache
+from retrieval.index import VectorIndex
+from retrieval.scraper import ScraperLocal
+from retrieval.splitter import RecursiveSplitter
+from util.executor import BoundedExecutor
+from util.http_client import HttpClients
+from util.tracing import Tracer
+
+PERCENTILES = (50, 95, 99)
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    points = np.percentile(np.asarray(values) * 1000, PERCENTILES)
+    return {
+        **{f"p{p}_ms": float(point) for p, point in zip(PERCENTILES, points)},
+        "count": len(values),
+    }
+
+
+async def run(site: LocalSite, args) -> dict:
+    executor: Optional[BoundedExecutor] = None
+    if args.parser != "inline":
+        executor = BoundedExecutor(kind=args.parser, max_workers=args.workers)
+
+    splitter = RecursiveSplitter(chunk_size=400, chunk_overlap=50)
+    links = [f"{site.base_url}/pages/{i}" for i in range(args.links)]
+    try:
+        async with HttpClients(limit_per_host=0) as http:
+            retriever = Retriever(
+                searcher=FakeSearcher(links, delay=args.search_delay),
+                scraper=ScraperLocal(
+                    http=http,
+                    streaming=True,
+                    executor=executor,
+                    extraction=args.extraction,
+                ),
+                embeddings=HashEmbeddings(
+                    dimension=args.dimension, delay=args.embed_delay
+                ),
+                splitter=splitter,
+                cache=SemanticCache() if args.semantic_cache else None,
+                index=VectorIndex() if args.index else None,
+            )
+            slots = asyncio.Semaphore(args.concurrency)
+            stages: dict[str, list[float]] = {}
+            totals: list[float] = []
+
+            async def question(number: int):
+                async with slots:
+                    tracer = Tracer()
+                    start = time.perf_counter()
+                    with tracer.activate():
+                        async for _ in retriever.get_context(
+                            f"question {number}", k=10
+                        ):
+                            pass
+                    totals.append(time.perf_counter() - start)
+                    for span in tracer.spans:
+                        stages.setdefault(span.name, []).append(span.end - span.start)  # type: ignore
+
+            # Warm up connections and pools so start-up is not measured.
+            await question(-1)
+            stages.clear()
+            totals.clear()
+
+            start = time.perf_counter()
+            await asyncio.gather(*(question(i) for i in range(args.queries)))
+            elapsed = time.perf_counter() - start
+    finally:
+        splitter.close()
+        if executor is not None:
+            executor.shutdown()
+
+    return {
+        "seconds": elapsed,
+        "queries_per_second": args.queries / elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        # Largest parser worker, known once the pool has been shut down.
+        "peak_rss_worker_mb": peak_rss_mb(resource.RUSAGE_CHILDREN),
+        "query": percentiles(totals),
+        "stages": {name: percentiles(values) for name, values in stages.items()},
+    }
+
+
+def print_report(result: dict, baseline: Optional[dict]) -> None:
+    def delta(path: list[str]) -> str:
+        if baseline is None:
+            return ""
+        before = baseline["result"]
+        for key in path:
+            before = before.get(key, {}) if isinstance(before, dict) else {}
+        now = result
+        for key in path:
+            now = now[key]
+        if not before:
+            return f" {'new':>8}"
+        return f" {now / before:>7.2f}x"  # type: ignore
+
+    print(
+        f"{result['queries_per_second']:.2f} queries/s, "
+        f"peak RSS {result['peak_rss_mb']:.0f} MB "
+        f"(worker {result['peak_rss_worker_mb']:.0f} MB){delta(['queries_per_second'])}"
+    )
+    header = " ".join(f"{f'p{p} (ms)':>10}" for p in PERCENTILES)
+    print(
+        f"{'stage':>16} {'count':>6} {header}" + (f" {'p50 vs':>8}" if baseline else "")
+    )
+    rows = [("query", result["query"], ["query", "p50_ms"])] + [
+        (name, stats, ["stages", name, "p50_ms"])
+        for name, stats in result["stages"].items()
+    ]
+    for name, stats, path in rows:
+        values = " ".join(f"{stats[f'p{p}_ms']:>10.1f}" for p in PERCENTILES)
+        print(f"{name:>16} {stats['count']:>6} {values}{delta(path)}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--links", type=int, default=5)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--page-sizes", type=int, nargs=2, default=[20_000, 200_000])
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.02, 0.3])
+    parser.add_argument(
+        "--distribution", choices=["uniform", "lognormal"], default="lognormal"
+    )
+    parser.add_argument("--search-delay", type=float, default=0.2)
+    parser.add_argument("--embed-delay", type=float, default=0.1)
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument(
+        "--parser", choices=["inline", "thread", "process"], default="process"
+    )
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--extraction", choices=["full", "main"], default="main")
+    parser.add_argument("--semantic-cache", action="store_true")
+    parser.add_argument("--index", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    args = parser.parse_args()
+
+    async with LocalSite(
+        pages=args.pages,
+        page_sizes=tuple(args.page_sizes),
+        latency=tuple(args.latency),
+        seed=args.seed,
+        distribution=args.distribution,
+    ) as site:
+        result = await run(site, args)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+    print_report(result, baseline)
+
+    revision = commit()
+    output = args.output or os.path.join(
+        ".cache",
+        "benchmarks",
+        f"retriever-{revision}-{time.strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as file:
+        json.dump(
+            {"commit": revision, "arguments": vars(args), "result": result},
+            file,
+            indent=2,
+        )
+    print(f"saved {output}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,142 @@
+"""Load test of the scraper service: pages per second as instances are added.
+
+For each instance count the service is started with `python -m
+scraper_service`, a fresh page cache and one parser worker per instance,
+and every page of a LocalSite is requested once through the balancer with
+fixed concurrency. The per-domain limit is raised, since every page comes
+from the same local host.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.scraper_service --instances 1 2 4
+"""
+
+import argparse
+import asyncio
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import aiohttp
+
+from benchmarks.standins import LocalSite
+
+
+def free_port(count: int) -> int:
+    """A port followed by `count` more that were free a moment ago."""
+
+    while True:
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        ports = range(port, port + count + 1)
+        if all(available(p) for p in ports):
+            return port
+
+
+def available(port: int) -> bool:
+    with socket.socket() as probe:
+        try:
+            probe.bind(("127.0.0.1", port))
+        except OSError:
+            return False
+    return True
+
+
+async def wait_ready(session: aiohttp.ClientSession, url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(url) as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.monotonic() > deadline:
+            raise TimeoutError(url)
+        await asyncio.sleep(0.2)
+
+
+async def load(site: LocalSite, args, instances: int, cache: str) -> dict:
+    port = free_port(instances)
+    service = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "scraper_service",
+            "--port",
+            str(port),
+            "--instances",
+            str(instances),
+            "--workers",
+            str(args.workers),
+            "--per-domain",
+            str(args.per_domain),
+            "--cache",
+            cache,
+        ]
+    )
+    try:
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0)
+        ) as session:
+            base = f"http://127.0.0.1:{port}"
+            await wait_ready(session, f"{base}/health")
+            slots = asyncio.Semaphore(args.concurrency)
+            outcomes = {"ok": 0, "failed": 0}
+
+            async def scrape(number: int):
+                async with slots:
+                    url = f"{base}/scrape/?url={site.base_url}/pages/{number}"
+                    async with session.post(url) as response:
+                        await response.read()
+                        outcomes["ok" if response.status == 200 else "failed"] += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(scrape(i) for i in range(args.pages)))
+            elapsed = time.perf_counter() - start
+    finally:
+        service.terminate()
+        service.wait()
+
+    return {**outcomes, "pages_per_second": outcomes["ok"] / elapsed}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--instances", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--per-domain", type=int, default=64)
+    parser.add_argument("--pages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--page-sizes", type=int, nargs=2, default=[100_000, 300_000])
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.01, 0.1])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    async with LocalSite(
+        pages=args.pages,
+        page_sizes=tuple(args.page_sizes),
+        latency=tuple(args.latency),
+        seed=args.seed,
+    ) as site:
+        print(
+            f"{'instances':>10} {'ok':>5} {'failed':>7} {'pages/s':>8} {'speedup':>8}"
+        )
+        first = None
+        with tempfile.TemporaryDirectory() as directory:
+            for instances in args.instances:
+                cache = f"{directory}/pages-{instances}.sqlite3"
+                result = await load(site, args, instances, cache)
+                first = first or result["pages_per_second"]
+                print(
+                    f"{instances:>10} {result['ok']:>5} {result['failed']:>7}"
+                    f" {result['pages_per_second']:>8.1f}"
+                    f" {result['pages_per_second'] / first:>7.2f}x"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,100 @@
+"""Compares the NumPy top-k ranking against the former pandas/sklearn path.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.similarity
+"""
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import cosine_similarity
+
+from models.document import Document, DocumentBatch
+from retrieval import Retriever
+
+
+def pandas_most_similar(query_vector, data, k=5) -> list[Document]:
+    """The per-row DataFrame implementation that get_most_similar replaced."""
+
+    query_vector = np.array(query_vector).reshape(1, -1)
+
+    def compute_cosine_similarity(row):
+        return cosine_similarity(query_vector, row)[0][0]
+
+    df: Any = pd.DataFrame(data)
+    df["vector"] = df["vector"].apply(lambda x: np.array(x).reshape(1, -1))
+    df["similarity"] = df["vector"].apply(compute_cosine_similarity)
+    similar = df.nlargest(k, "similarity")[["text", "url", "vector", "similarity"]]
+    similar["vector"] = similar["vector"].apply(lambda x: x[0].tolist())
+
+    json_docs = similar.to_dict("records")
+
+    return [Document(**json_doc) for json_doc in json_docs]
+
+
+def make_data(n: int, dimension: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((n, dimension)).tolist()
+    data = [
+        {"text": f"chunk {i}", "url": f"https://example.com/{i % 5}", "vector": v}
+        for i, v in enumerate(vectors)
+    ]
+    query_vector = [rng.standard_normal(dimension).tolist()]
+    return query_vector, data
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    retriever = Retriever(searcher=None, scraper=None, embeddings=None, splitter=None)  # type: ignore
+
+    print(f"{'chunks':>8} {'pandas (ms)':>12} {'numpy (ms)':>12} {'speedup':>8}")
+    for n in args.sizes:
+        query_vector, data = make_data(n, args.dimension)
+
+        batch = DocumentBatch(
+            [doc["vector"] for doc in data],
+            [doc["text"] for doc in data],
+            [doc["url"] for doc in data],
+        )
+
+        legacy = pandas_most_similar(query_vector, data, args.k)
+        current = asyncio.run(retriever.get_most_similar(query_vector, batch, args.k))
+        assert [d.text for d in legacy] == current.texts
+
+        legacy_time = timed(
+            lambda: pandas_most_similar(query_vector, data, args.k), args.repeat
+        )
+        current_time = timed(
+            lambda: asyncio.run(
+                retriever.get_most_similar(query_vector, batch, args.k)
+            ),
+            args.repeat,
+        )
+        print(
+            f"{n:>8} {legacy_time * 1000:>12.2f} {current_time * 1000:>12.2f}"
+            f" {legacy_time / current_time:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compares the native RecursiveSplitter with LangChainSplitter on generated
+pages, checking that both produce identical chunks.
+
+Run from src/orchestrator:
+
+    python -m benchmarks.splitter
+"""
+
+import argparse
+import asyncio
+import time
+
+from benchmarks.standins import make_page
+from retrieval.extract import soup_text
+from retrieval.splitter import LangChainSplitter, RecursiveSplitter
+
+
+async def timed(coroutine_function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await coroutine_function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--page-size", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    texts = [soup_text(make_page(args.page_size, seed=i)) for i in range(args.pages)]
+    langchain = LangChainSplitter(chunk_size=400, chunk_overlap=50, length_function=len)
+    native = RecursiveSplitter(chunk_size=400, chunk_overlap=50)
+
+    expected = [await langchain.split(text) for text in texts]
+    assert await native.split_many(texts) == expected
+
+    async def langchain_serial():
+        for text in texts:
+            await langchain.split(text)
+
+    async def native_serial():
+        for text in texts:
+            await native.split(text)
+
+    async def native_spans():
+        await native.split_many_spans(texts)
+
+    async def native_batch():
+        await native.split_many(texts)
+
+    chunks = sum(map(len, expected))
+    print(f"{args.pages} pages, {chunks} chunks")
+    for name, function in (
+        ("langchain, one page at a time", langchain_serial),
+        ("native, one page at a time", native_serial),
+        ("native split_many_spans (offsets)", native_spans),
+        ("native split_many (strings)", native_batch),
+    ):
+        seconds = await timed(function, args.repeat)
+        print(f"  {name:<36} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,341 @@
+"""Local stand-ins for the services the retrieval pipeline talks to."""
+
+import asyncio
+import hashlib
+import math
+import random
+from typing import AsyncIterator, Optional
+
+import numpy as np
+import aiohttp
+from aiohttp import web
+
+from mocks.test_dict import provisional_search_result
+from llm.chat import ChatModel
+from models.search import SearchResult
+from retrieval.embeddings import Embeddings
+from retrieval.scraper import failure_reason
+from retrieval.search import Searcher
+from scraper_service.batch import stream_batch
+
+WORDS = (
+    "langchain framework language model application developer python agent "
+    "retrieval prompt vector embedding document chain memory tool open source"
+).split()
+
+
+def make_page(size: int, seed: int = 0) -> str:
+    """Builds an HTML page of roughly `size` bytes with menus, scripts and prose."""
+
+    rng = random.Random(seed)
+    head = (
+        "<html><head><title>Fixture</title><style>body{margin:0}</style>"
+        "<script>window.analytics = {track: function () {}};</script></head><body>"
+        "<nav><ul>"
+        + "".join(f"<li><a href='/{w}'>{w}</a></li>" for w in WORDS)
+        + "</ul></nav>"
+        "<article>"
+    )
+    tail = "</article><footer>Copyright. All rights reserved.</footer></body></html>"
+
+    paragraphs = []
+    size_left = size - len(head) - len(tail)
+    while size_left > 0:
+        sentence = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 60)))
+        paragraph = f"<p>{sentence.capitalize()}.</p>"
+        paragraphs.append(paragraph)
+        size_left -= len(paragraph)
+
+    return head + "".join(paragraphs) + tail
+
+
+TOPICS = {
+    "apple trees": "apple tree orchard plant spring soil root prune sapling water sun fruit",
+    "langchain": "langchain chain agent prompt llm retrieval vector memory tool python",
+    "sourdough": "sourdough starter flour water dough bake oven crust yeast ferment loaf",
+    "marathon": "marathon training run pace mile long recovery shoes race stretch",
+}
+FILLER = "the a of and to in is for that with on as it this by are can".split()
+
+
+def make_article_page(topic: str, paragraphs: int = 12, seed: int = 0) -> str:
+    """Builds a news-style page: one article about `topic` wrapped in a cookie
+    banner, menus, a related-articles sidebar, a newsletter box and a footer."""
+
+    rng = random.Random(seed)
+    words = TOPICS[topic].split()
+
+    def sentence(vocabulary: list[str], length: int) -> str:
+        picked = [
+            rng.choice(vocabulary) if rng.random() < 0.4 else rng.choice(FILLER)
+            for _ in range(length)
+        ]
+        return " ".join(picked).capitalize() + "."
+
+    article = "".join(
+        "<p>"
+        + " ".join(sentence(words, rng.randint(12, 25)) for _ in range(4))
+        + "</p>"
+        for _ in range(paragraphs)
+    )
+    related = "".join(
+        f"<li><a href='/related/{i}'>{sentence(WORDS, 8)}</a></li>" for i in range(12)
+    )
+    menu = "".join(f"<a href='/{w}'>{w.title()}</a> " for w in WORDS)
+    footer_links = "".join(
+        f"<li><a href='/{w}'>{w.title()} and more</a></li>" for w in WORDS
+    )
+
+    return (
+        f"<html><head><title>{topic.title()}</title></head><body>"
+        "<div class='cookie-banner'><p>We use cookies to improve your experience, "
+        "personalise content and ads, and analyse our traffic. By continuing to "
+        "browse you accept our cookie policy.</p><button>Accept</button></div>"
+        f"<div id='top'><div class='menu'>{menu}</div></div>"
+        f"<div id='page'><div id='content'><h1>All about {topic}</h1>{article}</div>"
+        f"<div id='sidebar'><h3>Related articles</h3><ul>{related}</ul>"
+        "<div class='newsletter'><p>Subscribe to our newsletter to get the latest "
+        "news, offers and updates delivered to your inbox every single week, "
+        "for free.</p></div></div></div>"
+        f"<div id='bottom'><ul>{footer_links}</ul><p>Copyright 2023 Example Media "
+        "Group, all rights reserved. Terms of use, privacy policy and cookie "
+        "settings.</p></div></body></html>"
+    )
+
+
+def sample(rng: random.Random, bounds: tuple[float, float], distribution: str) -> float:
+    """Draws from `bounds`: uniformly, or from a lognormal whose 5th and 95th
+    percentiles are the bounds, which gives the long tail of real latencies
+    and page sizes."""
+
+    low, high = bounds
+    if distribution == "uniform" or high <= 0:
+        return rng.uniform(low, high)
+    if distribution != "lognormal":
+        raise ValueError(f"Unknown distribution: {distribution}")
+
+    low = max(low, high / 1000)
+    mu = (math.log(low) + math.log(high)) / 2
+    sigma = (math.log(high) - math.log(low)) / (2 * 1.645)
+    return rng.lognormvariate(mu, sigma)
+
+
+class LocalSite:
+    """aiohttp server on localhost that stands in for Google and the scraped sites.
+
+    GET /search answers with a search result pointing at /pages/<n>, and
+    GET /pages/<n> serves a generated HTML page. Latency is drawn from
+    `latency` seconds and page sizes from `page_sizes` bytes, uniformly or
+    with a lognormal tail (see `sample`)."""
+
+    def __init__(
+        self,
+        pages: int = 5,
+        page_sizes: tuple[int, int] = (20_000, 200_000),
+        latency: tuple[float, float] = (0.0, 0.0),
+        seed: int = 0,
+        distribution: str = "uniform",
+    ) -> None:
+        self.pages = pages
+        self.latency = latency
+        self.distribution = distribution
+        self.rng = random.Random(seed)
+        self.bodies = [
+            make_page(int(sample(self.rng, page_sizes, distribution)), seed=seed + i)
+            for i in range(pages)
+        ]
+        self.requests = 0
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def delay(self) -> None:
+        self.requests += 1
+        if self.latency[1] > 0:
+            await asyncio.sleep(sample(self.rng, self.latency, self.distribution))
+
+    async def search(self, request: web.Request) -> web.Response:
+        await self.delay()
+        items = [
+            {**item, "link": f"{self.base_url}/pages/{i % self.pages}"}
+            for i, item in enumerate(provisional_search_result["items"][: self.pages])
+        ]
+        return web.json_response({"items": items})
+
+    async def page(self, request: web.Request) -> web.Response:
+        await self.delay()
+        body = self.bodies[int(request.match_info["number"]) % self.pages]
+        return web.Response(text=body, content_type="text/html")
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/search", self.search)
+        app.router.add_get("/pages/{number}", self.page)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.runner = web.AppRunner(self.application())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    async def __aenter__(self) -> "LocalSite":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+
+class LocalScraperService:
+    """aiohttp server on localhost that stands in for the remote scraper service.
+
+    POST /scrape/?url=<url> fetches one page and answers {"html"}. POST
+    /scrape/batch takes {"urls": [...]} and streams one NDJSON line per url,
+    {"url", "html"} or {"url", "error"}, in the order the pages finish.
+    `requests` counts the requests received on both endpoints."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.runner: Optional[web.AppRunner] = None
+        self.base_url = ""
+
+    async def item(self, url: str) -> dict:
+        try:
+            async with self.session.get(url) as response:  # type: ignore
+                response.raise_for_status()
+                return {"url": url, "html": await response.text()}
+        except Exception as e:
+            return {"url": url, "error": failure_reason(e)}
+
+    async def scrape(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        item = await self.item(request.query["url"])
+        if "error" in item:
+            return web.json_response({"error": item["error"]}, status=502)
+        return web.json_response({"html": item["html"]})
+
+    async def batch(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        return await stream_batch(request, self.item)
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/scrape/", self.scrape)
+        app.router.add_post("/scrape/batch", self.batch)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=0))
+        self.runner = web.AppRunner(self.application())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = self.runner.addresses[0][1]
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
+        if self.session is not None:
+            await self.session.close()
+
+    async def __aenter__(self) -> "LocalScraperService":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+
+class FakeSearcher(Searcher):
+    """Returns the given links for every query, after an optional delay."""
+
+    def __init__(self, links: list[str], delay: float = 0.0) -> None:
+        self.links = links
+        self.delay = delay
+        self.calls = 0
+
+    async def run(self, query: str) -> SearchResult:
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return SearchResult(items=[{"link": link} for link in self.links])  # type: ignore
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic embeddings derived from a SHAKE-256 digest of each chunk.
+
+    Vectors carry no meaning, but identical texts always get identical vectors
+    and the cost is a few microseconds per chunk. An optional delay stands in
+    for the network round trip of each call."""
+
+    def __init__(self, dimension: int = 1536, delay: float = 0.0) -> None:
+        self.dimension = dimension
+        self.delay = delay
+        self.calls = 0
+        self.chunks = 0
+
+    async def run(self, chunks: list[str]) -> list[list[float]]:
+        self.calls += 1
+        self.chunks += len(chunks)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        vectors = []
+        for chunk in chunks:
+            digest = hashlib.shake_256(chunk.encode()).digest(self.dimension)
+            vector = np.frombuffer(digest, dtype=np.uint8).astype(np.float32) - 127.5
+            vectors.append(vector.tolist())
+        return vectors
+
+
+class LexicalEmbeddings(Embeddings):
+    """Bag-of-words vectors built with the hashing trick.
+
+    Texts that share words get similar vectors, which is enough to compare
+    retrieval results offline."""
+
+    def __init__(self, dimension: int = 1024) -> None:
+        self.dimension = dimension
+
+    async def run(self, chunks: list[str]) -> list[list[float]]:
+        vectors = []
+        for chunk in chunks:
+            vector = np.zeros(self.dimension, dtype=np.float32)
+            for word in chunk.lower().split():
+                word = word.strip(".,;:!?")
+                digest = hashlib.blake2b(word.encode(), digest_size=8).digest()
+                vector[int.from_bytes(digest, "little") % self.dimension] += 1.0
+            vectors.append(vector.tolist())
+        return vectors
+
+
+class FakeChat(ChatModel):
+    """Streams a canned answer at a fixed rate after a first-token delay."""
+
+    def __init__(
+        self,
+        tokens: int = 200,
+        tokens_per_second: float = 50.0,
+        first_token_delay: float = 0.3,
+    ) -> None:
+        self.model = "fake"
+        self.tokens = tokens
+        self.tokens_per_second = tokens_per_second
+        self.first_token_delay = first_token_delay
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        await asyncio.sleep(self.first_token_delay)
+        for i in range(self.tokens):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield f"{WORDS[i % len(WORDS)]} "
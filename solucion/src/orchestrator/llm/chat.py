@@ -0,0 +1,38 @@
+from abc import ABC, abstractmethod
+from typing import AsyncIterator
+
+import openai
+
+
+class ChatModel(ABC):
+    """Abstraction of a streaming chat client."""
+
+    @abstractmethod
+    def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yields the answer token by token without blocking the event loop.
+
+        Closing the iterator or cancelling the consuming task stops the
+        generation and releases the connection."""
+
+
+class OpenAIChat(ChatModel):
+    """OpenAI chat completions client wrapper"""
+
+    def __init__(self, model: str = "gpt-3.5-turbo", temperature: float = 0.0) -> None:
+        self.model = model
+        self.temperature = temperature
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        response = await openai.ChatCompletion.acreate(
+            model=self.model,
+            temperature=self.temperature,
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+        )
+        try:
+            async for chunk in response:  # type: ignore
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content is not None:
+                    yield content
+        finally:
+            await response.aclose()  # type: ignore
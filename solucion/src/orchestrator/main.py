@@ -1,68 +1,191 @@
 import asyncio
 import json
+import os
+import threading
+import time
 from typing import AsyncGenerator
 from util import logger
 
 import prompt
-import openai
+from llm import OpenAIChat
 from retrieval import Retriever
+from retrieval.cache import SemanticCache
+from retrieval.context import ContextBuilder
+from retrieval.index import VectorIndex
 from retrieval.search import GoogleAPI
+from retrieval.search_cache import CachedSearcher
 from retrieval.scraper import ScraperLocal, ScraperRemote
 from retrieval.embeddings import OpenAIEmbeddings
-from retrieval.splitter import LangChainSplitter
-
-
-def stream_chat(prompt: str):
-    for chunk in openai.ChatCompletion.create(
-        model="gpt-3.5-turbo",
-        temperature=0.0,
-        messages=[{"role": "user", "content": prompt}],
-        stream=True,
-    ):
-        content = chunk["choices"][0].get("delta", {}).get("content")  # type: ignore
-        if content is not None:
-            yield content
-
-
-async def event_generator(query) -> AsyncGenerator[dict, None]:
-    embeddings = OpenAIEmbeddings()
-    google = GoogleAPI()
-    scraper = ScraperLocal()
-    splitter = LangChainSplitter(chunk_size=400, chunk_overlap=50, length_function=len)
-
-    retriever = Retriever(
-        searcher=google,
-        scraper=scraper,
-        embeddings=embeddings,
-        splitter=splitter,
-    )
-    async for event in retriever.get_context(query=query, cache_treshold=0.85, k=10):
-        yield event
-        if event["event"] == "context":
-            final_prompt = prompt.rag.format(context=event["data"], question=query)
-
-            yield {"event": "prompt", "data": final_prompt}
-
-            for text in stream_chat(prompt=final_prompt):
-                yield {"event": "token", "data": text}
-
-
-async def main(query: str):
-    async for event in event_generator(query):
+from retrieval.embedding_store import EmbeddingStore
+from retrieval.page_store import PageStore
+from retrieval.splitter import RecursiveSplitter
+from util.executor import BoundedExecutor
+from util.http_client import HttpClients
+from util.tracing import Tracer, span, write_chrome_trace
+
+TRACE_DIR = os.environ.get("TRACE_DIR")
+
+
+class AppContext:
+    """Clients, pools and caches created once and shared by every question of
+    the session. Must be entered inside the session's event loop."""
+
+    async def __aenter__(self) -> "AppContext":
+        self.http = HttpClients()
+        self.http.configure("search", limit_per_host=4)
+        self.http.configure("scrape", limit_per_host=2, ttl_dns_cache=600)
+
+        self.embedding_store = EmbeddingStore(
+            path=".cache/embeddings.sqlite3", max_entries=200_000
+        )
+        self.page_store = PageStore(
+            path=".cache/pages.sqlite3", max_bytes=256 * 2**20, freshness=15 * 60
+        )
+        self.parser_pool = BoundedExecutor(
+            kind="process", max_workers=2, max_pending=16
+        )
+        self.splitter = RecursiveSplitter(chunk_size=400, chunk_overlap=50)
+        self.embeddings = OpenAIEmbeddings(store=self.embedding_store)
+        self.chat = OpenAIChat(model="gpt-3.5-turbo", temperature=0.0)
+        self.searcher = CachedSearcher(
+            GoogleAPI(http=self.http),
+            ttl=60 * 60,
+            stale_ttl=24 * 60 * 60,
+            max_size=512,
+            path=".cache/searches.sqlite3",
+        )
+
+        self.scraper = ScraperLocal(
+            http=self.http,
+            streaming=True,
+            executor=self.parser_pool,
+            extraction="main",
+            store=self.page_store,
+        )
+        self.retriever = Retriever(
+            searcher=self.searcher,
+            scraper=self.scraper,
+            embeddings=self.embeddings,
+            splitter=self.splitter,
+            cache=SemanticCache(max_size=256, ttl=60 * 60),
+            index=VectorIndex(),
+            scrape_deadline=8.0,
+            context_builder=ContextBuilder(max_tokens=800, relevance_weight=0.7),
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        logger.info(f"SCRAPER: {self.scraper.stats()}")
+        await self.embeddings.flush()
+        self.searcher.close()
+        await self.http.close()
+        self.parser_pool.shutdown()
+        self.splitter.close()
+        self.embedding_store.close()
+        self.page_store.close()
+
+
+async def event_generator(query, app: AppContext) -> AsyncGenerator[dict, None]:
+    """Events of one question, ending with a `trace` event that holds the spans
+    of every stage."""
+
+    tracer = Tracer()
+    with tracer.activate():
+        async for event in app.retriever.get_context(
+            query=query, cache_treshold=0.85, k=10
+        ):
+            yield event
+            if event["event"] == "context":
+                final_prompt = prompt.rag.format(context=event["data"], question=query)
+
+                yield {"event": "prompt", "data": final_prompt}
+
+                with span("llm", model=app.chat.model) as answering:
+                    stream = app.chat.stream(prompt=final_prompt)
+                    tokens = 0
+                    try:
+                        with span("llm_first_token"):
+                            text = await anext(stream, None)
+                        while text is not None:
+                            tokens += 1
+                            yield {"event": "token", "data": text}
+                            text = await anext(stream, None)
+                    finally:
+                        await stream.aclose()  # type: ignore
+                        answering.set(tokens=tokens)
+
+    logger.info(f"TRACE: {tracer.summary()}")
+    yield {"event": "trace", "data": json.dumps(tracer.to_dict(), default=str)}
+
+
+async def main(query: str, app: AppContext):
+    async for event in event_generator(query, app):
         if event["event"] == "search":
             for link in json.loads(event["data"])["items"]:
                 print(f"Link: {link['link']}")
 
             print(" ")
 
+        if event["event"] == "cache_hit":
+            for url in json.loads(event["data"])["urls"]:
+                print(f"Link (cache): {url}")
+
+            print(" ")
+
+        if event["event"] == "dropped":
+            for page in json.loads(event["data"])["pages"]:
+                print(f"Link (dropped): {page['url']} ({page['reason']})")
+
         if event["event"] == "token":
             print(event["data"], end="", flush=True)
 
+        if event["event"] == "trace" and TRACE_DIR:
+            path = os.path.join(
+                TRACE_DIR, f"trace-{time.strftime('%Y%m%d-%H%M%S')}.json"
+            )
+            write_chrome_trace(json.loads(event["data"]), path)
+
+
+async def read_input(message: str) -> str:
+    """input() on a daemon thread, so a pending prompt never blocks shutdown."""
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(setter, value):
+        if not future.done():
+            setter(value)
+
+    def read():
+        try:
+            line = input(message)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, future.set_exception, e)
+        else:
+            loop.call_soon_threadsafe(resolve, future.set_result, line)
+
+    threading.Thread(target=read, daemon=True).start()
+    return await future
+
+
+async def session():
+    """Runs the whole conversation on one event loop. Input is read in a thread
+    so background work keeps running while the user types."""
+
+    async with AppContext() as app:
+        while True:
+            print("")
+            try:
+                query = await read_input(">Enter your question: ")
+            except EOFError:
+                break
+            print("")
+            await main(query, app)
+            print("")
+
 
 if __name__ == "__main__":
-    while True:
-        print("")
-        query = input(">Enter your question: ")
-        print("")
-        asyncio.run(main(query))
-        print("")
+    try:
+        asyncio.run(session())
+    except KeyboardInterrupt:
+        pass
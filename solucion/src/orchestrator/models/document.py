@@ -1,9 +1,108 @@
 from pydantic import BaseModel
 from typing import Optional
 
+import numpy as np
+
 
 class Document(BaseModel):
     text: str
     url: str
     vector: list[float]
     similarity: float
+    sources: list[str] = []
+
+
+class DocumentBatch:
+    """Chunks held column-wise: one float32 matrix of vectors next to parallel
+    lists of texts, URLs, sources and (start, end) offsets into their page,
+    plus an array of scores once ranked. Offsets are None when unknown.
+
+    The retrieval pipeline passes batches around; pydantic Documents are only
+    built at the edges that need them, through `to_documents`."""
+
+    __slots__ = ("vectors", "texts", "urls", "sources", "offsets", "scores")
+
+    def __init__(
+        self,
+        vectors,
+        texts: list[str],
+        urls: list[str],
+        sources: Optional[list[list[str]]] = None,
+        scores: Optional[np.ndarray] = None,
+        offsets: Optional[list[Optional[tuple[int, int]]]] = None,
+    ) -> None:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim != 2:
+            matrix = matrix.reshape(len(texts), -1)
+        self.vectors = np.ascontiguousarray(matrix)
+        self.texts = texts
+        self.urls = urls
+        self.sources = sources if sources is not None else [[url] for url in urls]
+        self.offsets = offsets if offsets is not None else [None] * len(texts)
+        self.scores = scores
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @classmethod
+    def empty(cls, dimension: int = 0) -> "DocumentBatch":
+        return cls(np.empty((0, dimension), dtype=np.float32), [], [])
+
+    @classmethod
+    def concat(cls, batches: list["DocumentBatch"]) -> "DocumentBatch":
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty()
+        if len(batches) == 1:
+            return batches[0]
+
+        scores = None
+        if all(batch.scores is not None for batch in batches):
+            scores = np.concatenate([batch.scores for batch in batches])  # type: ignore
+        return cls(
+            np.concatenate([batch.vectors for batch in batches]),
+            [text for batch in batches for text in batch.texts],
+            [url for batch in batches for url in batch.urls],
+            [sources for batch in batches for sources in batch.sources],
+            scores,
+            [offset for batch in batches for offset in batch.offsets],
+        )
+
+    def take(self, indices, scores: Optional[np.ndarray] = None) -> "DocumentBatch":
+        """The rows at the given indices, in that order, optionally rescored."""
+
+        if scores is None and self.scores is not None:
+            scores = self.scores[indices]
+        return DocumentBatch(
+            self.vectors[indices],
+            [self.texts[i] for i in indices],
+            [self.urls[i] for i in indices],
+            [self.sources[i] for i in indices],
+            None if scores is None else np.asarray(scores, dtype=np.float32),
+            [self.offsets[i] for i in indices],
+        )
+
+    def source_urls(self) -> list[str]:
+        """Every URL that carried one of the chunks, in order of appearance."""
+
+        return list(dict.fromkeys(url for sources in self.sources for url in sources))
+
+    def mean_score(self) -> float:
+        if not len(self) or self.scores is None:
+            return 0.0
+        return float(self.scores.mean())
+
+    def to_documents(self) -> list[Document]:
+        scores = self.scores if self.scores is not None else np.zeros(len(self))
+        return [
+            Document(
+                text=text,
+                url=url,
+                vector=vector,
+                similarity=float(score),
+                sources=sources,
+            )
+            for text, url, vector, score, sources in zip(
+                self.texts, self.urls, self.vectors.tolist(), scores, self.sources
+            )
+        ]
@@ -22,3 +22,5 @@ class SearchDoc(BaseModel):
 
 class SearchResult(BaseModel):
     items: list[SearchDoc]
+    # Set when the items are the mocks served in place of a failed search.
+    fallback: bool = False
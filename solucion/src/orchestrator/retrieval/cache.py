@@ -0,0 +1,65 @@
+import itertools
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from models.document import DocumentBatch
+from retrieval.ranking import normalize, to_matrix
+from util.cache import TTLCache
+
+
+class _Entry(NamedTuple):
+    query: np.ndarray
+    vectors: np.ndarray
+    documents: DocumentBatch
+
+
+class SemanticCache:
+    """Keeps the documents selected for past queries so that semantically close
+    questions can be answered without searching the internet again."""
+
+    def __init__(
+        self, max_size: int = 256, ttl: Optional[float] = 3600, candidates: int = 3
+    ) -> None:
+        self.entries = TTLCache(max_size=max_size, ttl=ttl)
+        self.candidates = candidates
+        self._ids = itertools.count()
+
+    def add(self, query_vector, documents: DocumentBatch) -> None:
+        if not len(documents):
+            return
+
+        query = normalize(to_matrix(query_vector))[0]
+        vectors = normalize(documents.vectors)
+        self.entries.set(next(self._ids), _Entry(query, vectors, documents))
+
+    def lookup(self, query_vector, k: int = 10) -> DocumentBatch:
+        """Returns the cached document set that best matches the query, rescored
+        against it. The caller decides whether the score is good enough."""
+
+        items = self.entries.items()
+        if not items:
+            return DocumentBatch.empty()
+
+        query = normalize(to_matrix(query_vector))[0]
+        keys = [key for key, _ in items]
+        entries: list[_Entry] = [entry for _, entry in items]
+
+        # Only the entries whose original query is closest get rescored.
+        closeness = np.stack([entry.query for entry in entries]) @ query
+        nearest = np.argsort(-closeness)[: self.candidates]
+
+        best_key, best_documents, best_score = None, DocumentBatch.empty(), -1.0
+        for i in nearest:
+            entry = entries[i]
+            scores = entry.vectors @ query
+            order = np.argsort(-scores, kind="stable")[:k]
+            score = float(scores[order].mean())
+            if score > best_score:
+                best_score = score
+                best_key = keys[i]
+                best_documents = entry.documents.take(order, scores[order])
+
+        # Mark the entry as recently used.
+        self.entries.get(best_key)
+        return best_documents
@@ -0,0 +1,117 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+from models.document import DocumentBatch
+from retrieval.ranking import normalize, to_matrix
+from util.tokens import estimate_tokens
+
+
+class ContextBuilder:
+    """Assembles the prompt context from ranked chunks.
+
+    Chunks are picked by maximal marginal relevance on the vectors they
+    already carry: each pick maximizes `relevance_weight` times the similarity
+    to the query minus the rest times the similarity to the closest chunk
+    already picked. Picking stops when no chunk fits in `max_tokens`. Picked
+    chunks of the same page whose offsets overlap or touch are merged, so the
+    splitter's overlap is only sent once."""
+
+    def __init__(
+        self,
+        max_tokens: int = 800,
+        relevance_weight: float = 0.7,
+        count_tokens: Callable[[str], int] = estimate_tokens,
+    ) -> None:
+        self.max_tokens = max_tokens
+        self.relevance_weight = relevance_weight
+        self.count_tokens = count_tokens
+
+    def select(self, query_vector, documents: DocumentBatch) -> list[int]:
+        """Indices of the picked chunks, in the order they were picked."""
+
+        if not len(documents):
+            return []
+
+        query = normalize(to_matrix(query_vector))[0]
+        vectors = normalize(documents.vectors)
+        relevance = vectors @ query
+        costs = np.array([self.count_tokens(text) for text in documents.texts])
+
+        redundancy = np.full(len(documents), -np.inf, dtype=np.float32)
+        available = np.ones(len(documents), dtype=bool)
+        budget = self.max_tokens
+        picked: list[int] = []
+        while True:
+            available &= costs <= budget
+            if not available.any():
+                return picked
+
+            penalty = np.where(np.isinf(redundancy), 0.0, redundancy)
+            scores = (
+                self.relevance_weight * relevance
+                - (1 - self.relevance_weight) * penalty
+            )
+            best = int(np.argmax(np.where(available, scores, -np.inf)))
+
+            picked.append(best)
+            available[best] = False
+            budget -= costs[best]
+            redundancy = np.maximum(redundancy, vectors @ vectors[best])
+
+    def merge(self, documents: DocumentBatch, picked: list[int]) -> list[str]:
+        """Texts of the picked chunks with overlapping or touching chunks of the
+        same page joined. Pieces keep the order of their first picked chunk."""
+
+        pieces: list[tuple[int, Optional[int], int, str]] = []
+        groups: dict[str, list[tuple[int, int, int, str]]] = {}
+        for rank, i in enumerate(picked):
+            offset = documents.offsets[i]
+            if offset is None:
+                pieces.append((rank, None, 0, documents.texts[i]))
+            else:
+                groups.setdefault(documents.urls[i], []).append(
+                    (offset[0], offset[1], rank, documents.texts[i])
+                )
+
+        for chunks in groups.values():
+            chunks.sort()
+            start, end, rank, text = chunks[0]
+            for next_start, next_end, next_rank, next_text in chunks[1:]:
+                # Consecutive chunks overlap, or are apart by the stripped
+                # separator at most.
+                if next_start <= end + 2:
+                    if next_end > end:
+                        # Offsets index the page text, so the overlap is the
+                        # first end - next_start characters of the next chunk.
+                        text += (" " if next_start > end else "") + next_text[
+                            max(0, end - next_start) :
+                        ]
+                        end = next_end
+                    rank = min(rank, next_rank)
+                else:
+                    pieces.append((rank, start, end, text))
+                    start, end, rank, text = next_start, next_end, next_rank, next_text
+            pieces.append((rank, start, end, text))
+
+        pieces.sort(key=lambda piece: piece[0])
+        return [piece[3] for piece in pieces]
+
+    def build(self, query_vector, documents: DocumentBatch) -> tuple[str, dict]:
+        """The context text and what it cost compared with joining every chunk."""
+
+        picked = self.select(query_vector, documents)
+        pieces = self.merge(documents, picked)
+        context = "\n".join(pieces)
+
+        full_tokens = self.count_tokens("\n".join(documents.texts))
+        tokens = self.count_tokens(context) if context else 0
+        stats = {
+            "chunks": len(documents),
+            "picked": len(picked),
+            "pieces": len(pieces),
+            "tokens": tokens,
+            "full_tokens": full_tokens,
+            "tokens_saved": full_tokens - tokens,
+        }
+        return context, stats
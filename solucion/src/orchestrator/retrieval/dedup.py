@@ -0,0 +1,83 @@
+import hashlib
+import re
+from typing import Optional
+
+import numpy as np
+
+WORD = re.compile(r"\w+")
+
+
+def simhash(text: str, shingle: int = 3) -> int:
+    """64-bit SimHash of the word shingles of a text. Texts that share most
+    shingles get fingerprints a few bits apart."""
+
+    words = WORD.findall(text.lower())
+    shingles = [
+        " ".join(words[i : i + shingle])
+        for i in range(max(1, len(words) - shingle + 1))
+    ]
+    digests = b"".join(
+        hashlib.blake2b(s.encode(), digest_size=8).digest() for s in shingles
+    )
+    bits = np.unpackbits(np.frombuffer(digests, dtype=np.uint8)).reshape(-1, 64)
+    weights = bits.sum(axis=0, dtype=np.int64) * 2 - len(shingles)
+    return int.from_bytes(np.packbits(weights > 0).tobytes(), "big")
+
+
+class Deduplicator:
+    """Drops chunks that are near-duplicates of a chunk already kept for the
+    same query, remembering every URL that carried the kept text.
+
+    Fingerprints are split into `bands` equal parts. Two fingerprints within
+    `max_distance` bits always share at least one part exactly when
+    max_distance < bands, so only chunks that share a part are compared."""
+
+    def __init__(self, max_distance: int = 3, bands: int = 4) -> None:
+        self.max_distance = max_distance
+        self.bands = bands
+        self.width = 64 // bands
+        self.buckets: list[dict[int, list[int]]] = [{} for _ in range(bands)]
+        self.fingerprints: list[int] = []
+        self.kept: list[dict] = []
+        self.seen = 0
+
+    def _parts(self, fingerprint: int) -> list[int]:
+        mask = (1 << self.width) - 1
+        return [(fingerprint >> (i * self.width)) & mask for i in range(self.bands)]
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        for band, part in enumerate(self._parts(fingerprint)):
+            for candidate in self.buckets[band].get(part, []):
+                distance = (fingerprint ^ self.fingerprints[candidate]).bit_count()
+                if distance <= self.max_distance:
+                    return candidate
+        return None
+
+    def add(self, document: dict) -> bool:
+        """Keeps the document unless it duplicates a kept one, in which case
+        its URL is added to that one's sources. Returns whether it was kept."""
+
+        self.seen += 1
+        fingerprint = simhash(document["text"])
+        duplicate = self.find(fingerprint)
+        if duplicate is not None:
+            sources = self.kept[duplicate]["sources"]
+            if document["url"] not in sources:
+                sources.append(document["url"])
+            return False
+
+        document["sources"] = [document["url"]]
+        number = len(self.kept)
+        self.kept.append(document)
+        self.fingerprints.append(fingerprint)
+        for band, part in enumerate(self._parts(fingerprint)):
+            self.buckets[band].setdefault(part, []).append(number)
+        return True
+
+    @property
+    def dropped(self) -> int:
+        return self.seen - len(self.kept)
+
+    @property
+    def ratio(self) -> float:
+        return self.dropped / self.seen if self.seen else 0.0
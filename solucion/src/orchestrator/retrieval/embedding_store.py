@@ -0,0 +1,118 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """SQLite-backed cache of embedding vectors keyed by model and sha256 of the
+    chunk text. Least recently used rows are evicted past max_entries."""
+
+    def __init__(self, path: str = ":memory:", max_entries: int = 200_000) -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                digest BLOB NOT NULL,
+                vector BLOB NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (model, digest)
+            )
+            """)
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS embeddings_used_at ON embeddings (used_at)"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def digest(text: str) -> bytes:
+        return hashlib.sha256(text.encode("utf-8")).digest()
+
+    def get_many(self, model: str, texts: list[str]) -> list[Optional[list[float]]]:
+        """Returns the stored vector for every text, None for misses."""
+
+        digests = [self.digest(text) for text in texts]
+        found: dict[bytes, list[float]] = {}
+
+        with self._lock:
+            # Stay below SQLite's default limit of bound parameters.
+            for start in range(0, len(digests), 900):
+                batch = list(set(digests[start : start + 900]))
+                placeholders = ",".join("?" * len(batch))
+                rows = self._connection.execute(
+                    f"SELECT digest, vector FROM embeddings "
+                    f"WHERE model = ? AND digest IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for digest, vector in rows:
+                    found[digest] = np.frombuffer(vector, dtype=np.float32).tolist()
+
+            if found:
+                now = time.time()
+                self._connection.executemany(
+                    "UPDATE embeddings SET used_at = ? WHERE model = ? AND digest = ?",
+                    [(now, model, digest) for digest in found],
+                )
+                self._connection.commit()
+
+        vectors = [found.get(digest) for digest in digests]
+        hits = sum(vector is not None for vector in vectors)
+        self.hits += hits
+        self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(
+        self, model: str, texts: list[str], vectors: list[list[float]]
+    ) -> None:
+        now = time.time()
+        rows = [
+            (
+                model,
+                self.digest(text),
+                np.asarray(vector, dtype=np.float32).tobytes(),
+                now,
+            )
+            for text, vector in zip(texts, vectors)
+        ]
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, digest, vector, used_at) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()
+            if count > self.max_entries:
+                self._connection.execute(
+                    "DELETE FROM embeddings WHERE rowid IN ("
+                    "SELECT rowid FROM embeddings ORDER BY used_at LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+            self._connection.commit()
+
+    def stats(self) -> dict[str, float]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
@@ -1,8 +1,23 @@
 from abc import ABC, abstractmethod
+import asyncio
 import json
+import time
+from typing import Callable, Optional
 import aiohttp
 
 import openai
+from util import logger
+from util.tokens import estimate_tokens
+from util.tracing import current_span, span
+from retrieval.embedding_store import EmbeddingStore
+
+RETRYABLE_ERRORS = (
+    openai.error.APIConnectionError,
+    openai.error.APIError,
+    openai.error.RateLimitError,
+    openai.error.ServiceUnavailableError,
+    openai.error.Timeout,
+)
 
 
 class Embeddings(ABC):
@@ -13,14 +28,130 @@ class Embeddings(ABC):
         pass
 
 
+def make_batches(
+    chunks: list[str],
+    max_tokens: int,
+    max_items: int,
+    count_tokens: Callable[[str], int] = estimate_tokens,
+) -> list[tuple[int, int]]:
+    """Cuts the chunks into consecutive (start, end) ranges bounded by token and
+    item count. A chunk larger than max_tokens gets a batch of its own."""
+
+    batches = []
+    start, tokens = 0, 0
+    for i, chunk in enumerate(chunks):
+        chunk_tokens = count_tokens(chunk)
+        if i > start and (tokens + chunk_tokens > max_tokens or i - start >= max_items):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += chunk_tokens
+    if start < len(chunks):
+        batches.append((start, len(chunks)))
+    return batches
+
+
 class OpenAIEmbeddings(Embeddings):
     """OpenAI embeddings client wrapper"""
 
     vector_dimension = 1536
 
+    def __init__(
+        self,
+        store: Optional[EmbeddingStore] = None,
+        max_batch_tokens: int = 8000,
+        max_batch_items: int = 256,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        retry_delay: float = 0.5,
+    ) -> None:
+        self.store = store
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pending_writes: set[asyncio.Task] = set()
+
     async def run(
         self, chunks: list[str], model="text-embedding-ada-002"
     ) -> list[list[float]]:
-        response = await openai.Embedding.acreate(input=chunks, model=model)
-        vectors = map(lambda x: x["embedding"], response["data"])  # type: ignore
-        return list(vectors)
+        if self.store is None:
+            return await self.embed(chunks, model)
+
+        vectors = await asyncio.to_thread(self.store.get_many, model, chunks)
+
+        # Identical chunks are only sent once.
+        missing: dict[str, list[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(chunks[i], []).append(i)
+
+        if missing:
+            texts = list(missing)
+            embedded = await self.embed(texts, model)
+            # Stored in the background; the caller only waits for the vectors.
+            write = asyncio.create_task(
+                asyncio.to_thread(self.store.put_many, model, texts, embedded)
+            )
+            self.pending_writes.add(write)
+            write.add_done_callback(self.pending_writes.discard)
+            for text, vector in zip(texts, embedded):
+                for i in missing[text]:
+                    vectors[i] = vector
+
+        hits = len(chunks) - sum(map(len, missing.values()))
+        current_span().set(cache_hits=hits, requested=len(missing))
+        logger.info(
+            f"EMBEDDING CACHE: {hits} hits, {len(missing)} requested, "
+            f"{self.store.stats()}"
+        )
+        return vectors  # type: ignore
+
+    async def flush(self) -> None:
+        """Waits for the background writes to the store."""
+
+        if self.pending_writes:
+            await asyncio.gather(*self.pending_writes)
+
+    async def embed(self, chunks: list[str], model: str) -> list[list[float]]:
+        """Embeds the chunks in bounded batches, running them concurrently."""
+
+        batches = make_batches(chunks, self.max_batch_tokens, self.max_batch_items)
+        results = await asyncio.gather(
+            *(
+                self.embed_batch(chunks[start:end], model, number)
+                for number, (start, end) in enumerate(batches)
+            )
+        )
+        return [vector for batch in results for vector in batch]
+
+    async def embed_batch(
+        self, chunks: list[str], model: str, number: int = 0
+    ) -> list[list[float]]:
+        """Sends one batch, retrying it on its own after transient errors."""
+
+        for attempt in range(self.max_retries + 1):
+            async with self.semaphore:
+                with span("embed_batch", batch=number, chunks=len(chunks)) as batch:
+                    batch.set(attempt=attempt)
+                    start = time.perf_counter()
+                    try:
+                        response = await openai.Embedding.acreate(
+                            input=chunks, model=model
+                        )
+                    except RETRYABLE_ERRORS as e:
+                        if attempt == self.max_retries:
+                            raise
+                        batch.set(error=repr(e))
+                        logger.warning(
+                            f"EMBEDDING BATCH {number} RETRY {attempt + 1}: {e}"
+                        )
+                    else:
+                        logger.info(
+                            f"EMBEDDING BATCH {number}: {len(chunks)} chunks "
+                            f"in {time.perf_counter() - start:.3f}s"
+                        )
+                        vectors = map(lambda x: x["embedding"], response["data"])  # type: ignore
+                        return list(vectors)
+
+            await asyncio.sleep(self.retry_delay * 2**attempt)
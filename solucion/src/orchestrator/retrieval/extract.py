@@ -0,0 +1,208 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import Optional
+
+from bs4 import BeautifulSoup
+
+META_CHARSET = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.I)
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+SKIPPED_TAGS = frozenset(
+    {"script", "style", "noscript", "template", "svg", "nav", "iframe", "object"}
+)
+
+
+def clean_text(raw_text: str) -> str:
+    return re.sub(r"\n{3,}|\s{2,}", "\n", raw_text)
+
+
+def soup_text(html) -> str:
+    """Parses all the text from the html with a full BeautifulSoup tree."""
+
+    soup = BeautifulSoup(html, "html.parser")
+    raw_text = soup.get_text(separator=" ", strip=True)
+    return clean_text(raw_text)
+
+
+class StreamingTextExtractor(HTMLParser):
+    """Incremental text extractor fed with decoded pieces of the document.
+
+    Text inside SKIPPED_TAGS is ignored and extraction stops once max_chars
+    characters have been collected, so callers can stop reading the body."""
+
+    def __init__(
+        self, max_chars: Optional[int] = None, skipped_tags=SKIPPED_TAGS
+    ) -> None:
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.skipped_tags = skipped_tags
+        self.parts: list[str] = []
+        self.chars = 0
+        self.skip_depth = 0
+        self.done = False
+
+    def handle_starttag(self, tag, attrs) -> None:
+        if tag in self.skipped_tags:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag) -> None:
+        if tag in self.skipped_tags and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data) -> None:
+        if self.skip_depth or self.done:
+            return
+
+        data = data.strip()
+        if data:
+            self.parts.append(data)
+            self.chars += len(data) + 1
+            if self.max_chars is not None and self.chars >= self.max_chars:
+                self.done = True
+
+    def text(self) -> str:
+        text = clean_text(" ".join(self.parts))
+        return text if self.max_chars is None else text[: self.max_chars]
+
+
+def streaming_text(html: str, max_chars: Optional[int] = None) -> str:
+    """Runs the streaming extractor over a document that is already in memory."""
+
+    extractor = StreamingTextExtractor(max_chars=max_chars)
+    extractor.feed(html)
+    extractor.close()
+    return extractor.text()
+
+
+BOILERPLATE_TAGS = [
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "iframe",
+    "form",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+]
+PARAGRAPH_TAGS = ["p", "pre", "blockquote", "td", "li", "dd"]
+CANDIDATE_TAGS = {"article", "main", "section", "div", "td", "body"}
+
+
+def link_density(element) -> float:
+    text_length = len(element.get_text(" ", strip=True))
+    if not text_length:
+        return 1.0
+    link_length = sum(len(a.get_text(" ", strip=True)) for a in element.find_all("a"))
+    return min(link_length / text_length, 1.0)
+
+
+def text_density(element) -> float:
+    """Characters of text per descendant tag."""
+
+    tags = sum(1 for _ in element.find_all(True))
+    return len(element.get_text(" ", strip=True)) / (tags + 1)
+
+
+def main_content_text(html, min_paragraph: int = 25) -> str:
+    """Keeps only the main article of a page, dropping menus, banners, footers
+    and link lists.
+
+    Paragraph-like elements vote for their parent and grandparent. Each voted
+    block is then weighted by its text density and penalised by its link
+    density. The best block is kept together with siblings that score close to
+    it. Pages without a clear winner fall back to the full text."""
+
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+
+    votes: dict[int, list] = {}
+    for paragraph in soup.find_all(PARAGRAPH_TAGS):
+        text = paragraph.get_text(" ", strip=True)
+        if len(text) < min_paragraph:
+            continue
+
+        score = 1 + text.count(",") + min(len(text) // 100, 3)
+        parent = paragraph.parent
+        for weight in (1.0, 0.5):
+            if parent is None or parent.name not in CANDIDATE_TAGS:
+                break
+            votes.setdefault(id(parent), [parent, 0.0])[1] += score * weight
+            parent = parent.parent
+
+    if not votes:
+        return clean_text(soup.get_text(separator=" ", strip=True))
+
+    def weighted(element, score: float) -> float:
+        density = min(text_density(element) / 40, 1.0)
+        return score * density * (1 - link_density(element))
+
+    scores = {key: weighted(element, score) for key, (element, score) in votes.items()}
+    best_key = max(scores, key=scores.__getitem__)
+    best = votes[best_key][0]
+    threshold = max(10.0, scores[best_key] * 0.2)
+
+    kept = []
+    siblings = best.parent.find_all(recursive=False) if best.parent else [best]
+    for sibling in siblings:
+        if sibling is best or scores.get(id(sibling), 0.0) >= threshold:
+            kept.append(sibling)
+        elif sibling.name in PARAGRAPH_TAGS and link_density(sibling) < 0.25:
+            if len(sibling.get_text(" ", strip=True)) >= 80:
+                kept.append(sibling)
+
+    raw_text = " ".join(element.get_text(" ", strip=True) for element in kept)
+    return clean_text(raw_text)
+
+
+def choose_encoding(declared: Optional[str], head: bytes) -> str:
+    """Charset of a body from its byte order mark, the charset of the
+    Content-Type header or a <meta> declaration in the first kilobyte, in that
+    order. Nothing is decoded; UTF-8 when none of them names a known codec."""
+
+    for bom, name in BOMS:
+        if head.startswith(bom):
+            return name
+
+    candidates = [declared]
+    match = META_CHARSET.search(head[:1024])
+    if match is not None:
+        candidates.append(match.group(1).decode("ascii"))
+    for name in candidates:
+        if name:
+            try:
+                return codecs.lookup(name).name
+            except LookupError:
+                pass
+    return "utf-8"
+
+
+def extract_text(
+    body: bytes,
+    encoding: str = "utf-8",
+    streaming: bool = False,
+    max_chars: Optional[int] = None,
+    extraction: str = "full",
+) -> str:
+    """Decodes a raw body and extracts its text. Module level so that it can be
+    shipped to a worker process."""
+
+    try:
+        html = body.decode(encoding, errors="replace")
+    except LookupError:
+        html = body.decode("utf-8", errors="replace")
+
+    if extraction == "main":
+        text = main_content_text(html)
+        return text if max_chars is None else text[:max_chars]
+    if streaming:
+        return streaming_text(html, max_chars)
+    return soup_text(html)
@@ -0,0 +1,221 @@
+import sys
+from typing import Optional
+
+import numpy as np
+
+from models.document import DocumentBatch
+from retrieval.ranking import normalize, to_matrix, top_k
+
+
+class VectorIndex:
+    """In-process IVF-flat index over chunk vectors, with their text and URL.
+
+    Vectors are normalized and stored in one growing float32 matrix. Until
+    `train_size` vectors are stored, search is brute force. After that, k-means
+    centroids split the vectors into inverted lists, and a query only scans the
+    `probes` lists whose centroids are closest. The centroids are retrained
+    whenever the index has grown `retrain_growth` times since the last
+    training. Deleted rows are masked and compacted away once they outnumber
+    the live ones."""
+
+    def __init__(
+        self,
+        dimension: Optional[int] = None,
+        probes: int = 8,
+        train_size: int = 4096,
+        retrain_growth: float = 4.0,
+        kmeans_iterations: int = 10,
+        seed: int = 0,
+    ) -> None:
+        self.dimension = dimension
+        self.probes = probes
+        self.train_size = train_size
+        self.retrain_growth = retrain_growth
+        self.kmeans_iterations = kmeans_iterations
+        self.rng = np.random.default_rng(seed)
+
+        self.size = 0
+        self.deleted = 0
+        self.vectors = np.empty((0, dimension or 0), dtype=np.float32)
+        self.alive = np.empty(0, dtype=bool)
+        self.texts: list[Optional[str]] = []
+        self.urls: list[Optional[str]] = []
+        self.url_rows: dict[str, list[int]] = {}
+        self.text_bytes = 0
+
+        self.centroids: Optional[np.ndarray] = None
+        self.trained_size = 0
+        self.lists: list[list[np.ndarray]] = []
+
+    def __len__(self) -> int:
+        return self.size - self.deleted
+
+    def insert(self, vectors, texts: list[str], urls: list[str]) -> None:
+        matrix = normalize(to_matrix(vectors))
+        if self.dimension is None:
+            self.dimension = matrix.shape[1]
+            self.vectors = np.empty((0, self.dimension), dtype=np.float32)
+
+        start, end = self.size, self.size + len(matrix)
+        self._reserve(end)
+        self.vectors[start:end] = matrix
+        self.alive[start:end] = True
+        self.size = end
+
+        for row, (text, url) in enumerate(zip(texts, urls), start):
+            self.texts.append(text)
+            self.urls.append(url)
+            self.url_rows.setdefault(url, []).append(row)
+            self.text_bytes += sys.getsizeof(text)
+
+        if self.centroids is None:
+            if len(self) >= self.train_size:
+                self.train()
+        elif len(self) >= self.trained_size * self.retrain_growth:
+            self.train()
+        else:
+            self._assign(np.arange(start, end))
+
+    def delete_url(self, url: str) -> int:
+        """Removes every chunk of the URL. Returns how many were removed."""
+
+        rows = self.url_rows.pop(url, [])
+        for row in rows:
+            self.alive[row] = False
+            self.text_bytes -= sys.getsizeof(self.texts[row])
+            self.texts[row] = None
+            self.urls[row] = None
+        self.deleted += len(rows)
+
+        if self.deleted > len(self):
+            self.compact()
+        return len(rows)
+
+    def search(
+        self, query_vector, k: int = 10, exclude_urls: Optional[set[str]] = None
+    ) -> DocumentBatch:
+        """Returns up to k chunks with their normalized vectors and scores, best
+        first, skipping chunks of the excluded URLs."""
+
+        if not len(self) or k <= 0:
+            return DocumentBatch.empty(self.dimension or 0)
+
+        query = normalize(to_matrix(query_vector))[0]
+        if self.centroids is None:
+            candidates = np.flatnonzero(self.alive[: self.size])
+        else:
+            closest = np.argsort(-(self.centroids @ query))[: self.probes]
+            candidates = np.concatenate([self._members(i) for i in closest])
+            candidates = candidates[self.alive[candidates]]
+
+        excluded = [
+            row for url in exclude_urls or () for row in self.url_rows.get(url, [])
+        ]
+        if excluded:
+            candidates = candidates[~np.isin(candidates, excluded)]
+
+        indices, scores = top_k(query, self.vectors[candidates], k, normalized=True)
+        rows = candidates[indices]
+        return DocumentBatch(
+            self.vectors[rows],
+            [self.texts[row] for row in rows],  # type: ignore
+            [self.urls[row] for row in rows],  # type: ignore
+            scores=scores,
+        )
+
+    def memory_bytes(self) -> dict[str, int]:
+        """Bytes held by each part of the index, with their total."""
+
+        usage = {
+            "vectors": self.vectors.nbytes,
+            "alive": self.alive.nbytes,
+            "centroids": 0 if self.centroids is None else self.centroids.nbytes,
+            "lists": sum(chunk.nbytes for chunks in self.lists for chunk in chunks),
+            "texts": self.text_bytes,
+            "metadata": sys.getsizeof(self.texts)
+            + sys.getsizeof(self.urls)
+            + sys.getsizeof(self.url_rows),
+        }
+        usage["total"] = sum(usage.values())
+        return usage
+
+    def train(self) -> None:
+        """Fits k-means centroids on a sample of the live vectors and rebuilds
+        the inverted lists."""
+
+        rows = np.flatnonzero(self.alive[: self.size])
+        count = max(1, int(np.sqrt(len(rows))))
+        sample_size = min(len(rows), 64 * count)
+        sample = self.vectors[self.rng.choice(rows, sample_size, replace=False)]
+
+        centroids = sample[self.rng.choice(sample_size, count, replace=False)]
+        for _ in range(self.kmeans_iterations):
+            assignment = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, sample)
+            empty = np.bincount(assignment, minlength=count) == 0
+            sums[empty] = centroids[empty]
+            centroids = normalize(sums)
+
+        self.centroids = centroids
+        self.trained_size = len(rows)
+        self.lists = [[] for _ in range(count)]
+        self._assign(rows)
+
+    def compact(self) -> None:
+        """Drops deleted rows, renumbering the live ones."""
+
+        rows = np.flatnonzero(self.alive[: self.size])
+        self.vectors = np.ascontiguousarray(self.vectors[rows])
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.texts = [self.texts[row] for row in rows]
+        self.urls = [self.urls[row] for row in rows]
+        self.size, self.deleted = len(rows), 0
+
+        self.url_rows = {}
+        for row, url in enumerate(self.urls):
+            self.url_rows.setdefault(url, []).append(row)  # type: ignore
+
+        if not self.size:
+            # Nothing left to describe; the next inserts train from scratch.
+            self.centroids, self.trained_size, self.lists = None, 0, []
+        elif self.centroids is not None:
+            self.lists = [[] for _ in range(len(self.centroids))]
+            self._assign(np.arange(self.size))
+
+    def _reserve(self, rows: int) -> None:
+        """Grows the storage geometrically so inserts stay amortized O(1)."""
+
+        capacity = len(self.vectors)
+        if rows <= capacity:
+            return
+
+        capacity = max(rows, 2 * capacity, 1024)
+        vectors = np.empty((capacity, self.dimension), dtype=np.float32)  # type: ignore
+        vectors[: self.size] = self.vectors[: self.size]
+        alive = np.zeros(capacity, dtype=bool)
+        alive[: self.size] = self.alive[: self.size]
+        self.vectors, self.alive = vectors, alive
+
+    def _assign(self, rows: np.ndarray, block: int = 65536) -> None:
+        if not len(rows):
+            return
+        # Blocks bound the size of the rows x centroids score matrix.
+        assignment = np.concatenate(
+            [
+                np.argmax(self.vectors[rows[i : i + block]] @ self.centroids.T, axis=1)  # type: ignore
+                for i in range(0, len(rows), block)
+            ]
+        )
+        order = np.argsort(assignment, kind="stable")
+        lists, starts = np.unique(assignment[order], return_index=True)
+        for number, members in zip(lists, np.split(rows[order], starts[1:])):
+            self.lists[number].append(members)
+
+    def _members(self, number: int) -> np.ndarray:
+        chunks = self.lists[number]
+        if not chunks:
+            return np.empty(0, dtype=np.intp)
+        if len(chunks) > 1:
+            chunks[:] = [np.concatenate(chunks)]
+        return chunks[0]
@@ -0,0 +1,250 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import NamedTuple, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PREFIXES = ("utm_", "fbclid", "gclid")
+
+
+def canonical_url(url: str) -> str:
+    """Store key of a URL: lowercase scheme and host, no default port, no
+    fragment, no tracking parameters and the remaining ones sorted."""
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    return urlunsplit((scheme, host, parts.path or "/", urlencode(query), ""))
+
+
+class StoredPage(NamedTuple):
+    url: str
+    digest: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class PageStore:
+    """SQLite store of scraped pages keyed by canonical URL.
+
+    Bodies are content-addressed by the sha256 of the raw HTML and the
+    extraction mode, so identical pages served under several URLs keep one
+    zlib-compressed copy and are parsed once. Each URL row keeps the
+    validators of its last response. Least recently used URLs are evicted,
+    with their orphaned bodies, once the bodies exceed max_bytes."""
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        max_bytes: int = 256 * 2**20,
+        freshness: float = 15 * 60,
+    ) -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.freshness = freshness
+        self.counts = {"fresh": 0, "revalidated": 0, "same_content": 0, "miss": 0}
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.executescript("""
+            CREATE TABLE IF NOT EXISTS bodies (
+                digest TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                html BLOB NOT NULL,
+                text TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                PRIMARY KEY (digest, mode)
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (url, mode)
+            );
+            CREATE INDEX IF NOT EXISTS pages_used_at ON pages (used_at);
+            CREATE INDEX IF NOT EXISTS pages_digest ON pages (digest, mode);
+            """)
+        self._connection.commit()
+
+    @staticmethod
+    def digest(html: bytes) -> str:
+        return hashlib.sha256(html).hexdigest()
+
+    def get(self, url: str, mode: str) -> Optional[StoredPage]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT pages.url, pages.digest, bodies.text, pages.etag, "
+                "pages.last_modified, pages.fetched_at FROM pages "
+                "JOIN bodies ON bodies.digest = pages.digest AND bodies.mode = pages.mode "
+                "WHERE pages.url = ? AND pages.mode = ?",
+                (canonical_url(url), mode),
+            ).fetchone()
+        return StoredPage(*row) if row is not None else None
+
+    def is_fresh(self, page: StoredPage) -> bool:
+        return time.time() - page.fetched_at <= self.freshness
+
+    def text(self, html: bytes, mode: str) -> Optional[str]:
+        """Text already extracted from an identical body, if any."""
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT text FROM bodies WHERE digest = ? AND mode = ?",
+                (self.digest(html), mode),
+            ).fetchone()
+        return row[0] if row is not None else None
+
+    def revalidated(
+        self,
+        page: StoredPage,
+        mode: str,
+        etag: Optional[str],
+        last_modified: Optional[str],
+    ) -> None:
+        """Restarts the freshness window after a 304, keeping new validators."""
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "UPDATE pages SET fetched_at = ?, used_at = ?, "
+                "etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+                "WHERE url = ? AND mode = ?",
+                (now, now, etag, last_modified, page.url, mode),
+            )
+            self._connection.commit()
+
+    def put(
+        self,
+        url: str,
+        mode: str,
+        html: bytes,
+        text: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        digest = self.digest(html)
+        compressed = zlib.compress(html, 6)
+        size = len(compressed) + len(text.encode("utf-8"))
+        now = time.time()
+
+        url = canonical_url(url)
+        with self._lock:
+            previous = self._connection.execute(
+                "SELECT digest FROM pages WHERE url = ? AND mode = ?", (url, mode)
+            ).fetchone()
+            self._connection.execute(
+                "INSERT OR IGNORE INTO bodies (digest, mode, html, text, size) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (digest, mode, compressed, text, size),
+            )
+            self._connection.execute(
+                "INSERT OR REPLACE INTO pages (url, mode, digest, etag, last_modified, "
+                "fetched_at, used_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, mode, digest, etag, last_modified, now, now),
+            )
+            # A changed page leaves its previous body behind.
+            if previous is not None and previous[0] != digest:
+                self._drop_orphan(previous[0], mode)
+            self._evict()
+            self._connection.commit()
+
+    def touch(self, page: StoredPage, mode: str) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE pages SET used_at = ? WHERE url = ? AND mode = ?",
+                (time.time(), page.url, mode),
+            )
+            self._connection.commit()
+
+    def html(self, url: str, mode: str) -> Optional[bytes]:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT bodies.html FROM pages JOIN bodies "
+                "ON bodies.digest = pages.digest AND bodies.mode = pages.mode "
+                "WHERE pages.url = ? AND pages.mode = ?",
+                (canonical_url(url), mode),
+            ).fetchone()
+        return zlib.decompress(row[0]) if row is not None else None
+
+    def record(self, outcome: str) -> None:
+        self.counts[outcome] += 1
+
+    def stats(self) -> dict[str, float]:
+        total = sum(self.counts.values())
+        hits = total - self.counts["miss"]
+        return {**self.counts, "hit_rate": hits / total if total else 0.0}
+
+    def size(self) -> int:
+        with self._lock:
+            (size,) = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM bodies"
+            ).fetchone()
+        return size
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def _drop_orphan(self, digest: str, mode: str) -> int:
+        """Deletes the body if no page points at it. Returns the bytes freed.
+        Called with the lock held."""
+
+        orphan = self._connection.execute(
+            "SELECT size FROM bodies WHERE digest = ? AND mode = ? AND NOT EXISTS "
+            "(SELECT 1 FROM pages WHERE digest = ? AND mode = ?)",
+            (digest, mode, digest, mode),
+        ).fetchone()
+        if orphan is None:
+            return 0
+        self._connection.execute(
+            "DELETE FROM bodies WHERE digest = ? AND mode = ?", (digest, mode)
+        )
+        return orphan[0]
+
+    def _evict(self) -> None:
+        # Called with the lock held.
+        (size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM bodies"
+        ).fetchone()
+        if size <= self.max_bytes:
+            return
+
+        # Bodies no page points at go before any live page.
+        self._connection.execute(
+            "DELETE FROM bodies WHERE NOT EXISTS (SELECT 1 FROM pages "
+            "WHERE pages.digest = bodies.digest AND pages.mode = bodies.mode)"
+        )
+        (size,) = self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM bodies"
+        ).fetchone()
+        while size > self.max_bytes:
+            row = self._connection.execute(
+                "SELECT url, mode, digest FROM pages ORDER BY used_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            url, mode, digest = row
+            self._connection.execute(
+                "DELETE FROM pages WHERE url = ? AND mode = ?", (url, mode)
+            )
+            size -= self._drop_orphan(digest, mode)
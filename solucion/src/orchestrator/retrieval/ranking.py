@@ -0,0 +1,44 @@
+import numpy as np
+
+
+def to_matrix(vectors) -> np.ndarray:
+    """Stacks vectors into one contiguous float32 matrix."""
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    if matrix.ndim == 1:
+        matrix = matrix.reshape(1, -1)
+    return np.ascontiguousarray(matrix)
+
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scales every row to unit length. Zero rows are left untouched."""
+
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def top_k(
+    query_vector, matrix: np.ndarray, k: int, normalized: bool = False
+) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the indices and cosine similarities of the k rows closest to the
+    query, best first."""
+
+    if len(matrix) == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+
+    query = normalize(to_matrix(query_vector))[0]
+    if not normalized:
+        matrix = normalize(matrix)
+
+    scores = matrix @ query
+
+    k = min(k, len(scores))
+    if k < len(scores):
+        candidates = np.sort(np.argpartition(-scores, k - 1)[:k])
+    else:
+        candidates = np.arange(len(scores))
+
+    # Stable sort keeps the original order between ties, as pandas nlargest did.
+    order = candidates[np.argsort(-scores[candidates], kind="stable")]
+    return order, scores[order]
@@ -1,16 +1,18 @@
 import asyncio
 import json
-import time
-from typing import Any, AsyncGenerator
-import numpy as np
-import pandas as pd
+from typing import AsyncGenerator, Optional
 from util import logger
-from models.document import Document
+from util.tracing import current_span, span
+from models.document import DocumentBatch
 from retrieval.search import Searcher
 from retrieval.splitter import Splitter
-from retrieval.scraper import Scraper
+from retrieval.scraper import Scraper, failure_reason
 from retrieval.embeddings import Embeddings
-from sklearn.metrics.pairwise import cosine_similarity
+from retrieval.ranking import top_k
+from retrieval.cache import SemanticCache
+from retrieval.index import VectorIndex
+from retrieval.dedup import Deduplicator
+from retrieval.context import ContextBuilder
 from models.search import SearchDoc, SearchResult
 
 
@@ -21,106 +23,311 @@ class Retriever:
         scraper: Scraper,
         embeddings: Embeddings,
         splitter: Splitter,
+        deduplicator: Optional[type[Deduplicator]] = Deduplicator,
+        cache: Optional[SemanticCache] = None,
+        index: Optional[VectorIndex] = None,
+        scrape_deadline: Optional[float] = None,
+        context_builder: Optional[ContextBuilder] = None,
     ) -> None:
         self.searcher = searcher
         self.scraper = scraper
         self.embeddings = embeddings
         self.splitter = splitter
+        self.deduplicator = deduplicator
+        self.cache = cache
+        self.index = index
+        self.scrape_deadline = scrape_deadline
+        self.context_builder = context_builder
 
     async def get_context(
         self, query: str, cache_treshold: float = 0.85, k: int = 10
     ) -> AsyncGenerator[dict, None]:
-        """Generates context based on query. It can retrieve from cache or from internet."""
+        """Generates context based on query. It can retrieve from cache or from internet.
 
-        query_vector = await self.embeddings.run([query])
+        Without a cache the query embedding and the search start together, and
+        scraping starts as soon as the search returns; only the ranking waits
+        for the query vector. With a cache nothing else starts until the lookup
+        misses, so a hit costs one query embedding and no search, scrape or
+        chunk embedding. Pages that could not be used are reported in a
+        `dropped` event before the context."""
 
-        search_results = await self.searcher.run(query)
+        embedding = asyncio.create_task(self.embed_query(query))
+        tasks = [embedding]
 
-        yield {"event": "search", "data": json.dumps(search_results.model_dump())}
+        try:
+            if self.cache is not None:
+                query_vector = await embedding
+                with span("cache_lookup") as lookup:
+                    cached = self.cache.lookup(query_vector, k)
+                    hit = await self.evaluate_retrieval(cached, cache_treshold)
+                    lookup.set(hit=hit, score=cached.mean_score())
+                if hit:
+                    score = await self.get_mean_similarity(cached)
+                    urls = cached.source_urls()
+                    yield {
+                        "event": "cache_hit",
+                        "data": json.dumps({"score": score, "urls": urls}),
+                    }
 
-        documents = await self.search_for_documents(search_results, query_vector, k)
+                    context = self.assemble(query_vector, cached)
+                    yield {"event": "context", "data": context}
+                    return
 
-        context = "\n".join([doc.text for doc in documents])
+            searching = asyncio.create_task(self.search(query))
+            retrieval = asyncio.create_task(self.retrieve(searching, embedding, k))
+            tasks += [searching, retrieval]
+
+            search_results = await searching
+            yield {"event": "search", "data": json.dumps(search_results.model_dump())}
+
+            documents, dropped = await retrieval
+            query_vector = await embedding
+        finally:
+            await self.settle(tasks)
+
+        if self.cache is not None:
+            self.cache.add(query_vector, documents)
+
+        if dropped:
+            yield {"event": "dropped", "data": json.dumps({"pages": dropped})}
+
+        context = self.assemble(query_vector, documents)
         yield {"event": "context", "data": context}
 
+    async def embed_query(self, query: str):
+        with span("query_embed", chunks=1):
+            return await self.embeddings.run([query])
+
+    async def search(self, query: str) -> SearchResult:
+        with span("search") as searching:
+            search_results = await self.searcher.run(query)
+            searching.set(links=len(search_results.items))
+            return search_results
+
+    async def retrieve(
+        self, searching: asyncio.Task, embedding: asyncio.Task, k: int
+    ) -> tuple[DocumentBatch, list[dict]]:
+        search_results = await searching
+        with span("retrieve"):
+            return await self.search_for_documents(search_results, embedding, k)
+
+    @staticmethod
+    async def settle(tasks: list[asyncio.Task]) -> None:
+        """Cancels the stage tasks still running when the caller leaves early
+        and waits for them, so no failure goes unretrieved. The fetch and embed
+        tasks of a cancelled retrieval are cancelled by search_for_documents."""
+
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
     async def search_for_documents(
         self, search_results, query_vector, k
-    ) -> list[Document]:
-        """Searches for relevant information on the internet."""
+    ) -> tuple[DocumentBatch, list[dict]]:
+        """Searches for relevant information on the internet. Every page is split
+        and embedded as soon as it arrives, while the others are still loading.
+        The query vector may be a task still running; it is awaited for ranking.
 
-        start = time.perf_counter()
+        Pages still loading when the scrape deadline passes are dropped and the
+        ranking goes on with the others. A page that fails to load or to embed
+        is dropped on its own. Returns the documents and a {"url", "reason"}
+        record per dropped page."""
 
-        results = search_results.model_dump()
-        tasks = [self.scraper.fetch(item["link"]) for item in results["items"]]
-        pages = await asyncio.gather(*tasks)
+        async def fetch(position: int, link: str):
+            with span("fetch", url=link) as fetching:
+                try:
+                    page = await self.scraper.fetch(link)
+                except Exception as e:
+                    logger.warning(f"FETCH: {link} failed: {e!r}")
+                    fetching.set(error=repr(e))
+                    return position, {
+                        "url": link,
+                        "text": None,
+                        "error": failure_reason(e),
+                    }
+                fetching.set(chars=len(page["text"] or ""))
+                return position, page
 
-        end = time.perf_counter()
-        logger.info(f"SCRAPE TIME: {end - start}")
+        async def embed(position: int, records: list[dict]):
+            texts = [record["text"] for record in records]
+            url = records[0]["url"]
+            with span("embed", url=url, chunks=len(texts)) as embedding:
+                try:
+                    vectors = await self.embeddings.run(texts)
+                except Exception as e:
+                    logger.warning(f"EMBED: {url} failed: {e!r}")
+                    embedding.set(error=repr(e))
+                    dropped.append({"url": url, "reason": failure_reason(e)})
+                    return
+            pages[position] = DocumentBatch(
+                vectors,
+                texts,
+                [record["url"] for record in records],
+                [record.get("sources", [record["url"]]) for record in records],
+                offsets=[record["offset"] for record in records],
+            )
 
-        documents = []
+        async def add(position: int, page: dict):
+            with span("split", url=page["url"], chars=len(page["text"])) as splitting:
+                splits = await self.splitter.split_spans(page["text"])
+                splitting.set(chunks=len(splits))
+
+            records = [
+                {
+                    "text": page["text"][start:end],
+                    "url": page["url"],
+                    "offset": (start, end),
+                }
+                for start, end in splits
+            ]
+            if dedup is not None:
+                with span("dedup", url=page["url"]) as deduplicating:
+                    records = [record for record in records if dedup.add(record)]
+                    deduplicating.set(
+                        kept=len(records), dropped=len(splits) - len(records)
+                    )
+            if records:
+                embedding_tasks.append(asyncio.create_task(embed(position, records)))
+
+        links = [item.link for item in search_results.items]
+        pages: list[DocumentBatch] = [DocumentBatch.empty() for _ in links]
+        embedding_tasks = []
+        dropped: list[dict] = []
         page_count = 0
-        for page in pages:
-            if page["text"]:
-                page_count += 1
-                splits = await self.splitter.split(page["text"])
-                for split in splits:
-                    documents.append({"text": split, "url": page["url"]})
-
-        logger.info(f"SCRAPED PAGES: {page_count}")
-        logger.info(f"SPLIT COUNT: {len(documents)}")
+        dedup = self.deduplicator() if self.deduplicator is not None else None
 
-        embedding_start_time = time.perf_counter()
-        texts = [doc["text"] for doc in documents]
-        embeddings = await self.embeddings.run(texts)
+        loop = asyncio.get_running_loop()
+        deadline = None
+        if self.scrape_deadline is not None:
+            deadline = loop.time() + self.scrape_deadline
 
-        for i, vector in enumerate(embeddings):
-            documents[i]["vector"] = vector
+        fetches = {
+            asyncio.create_task(fetch(position, link)): link
+            for position, link in enumerate(links)
+        }
+        pending = set(fetches)
+        try:
+            while pending:
+                timeout = None if deadline is None else max(0.0, deadline - loop.time())
+                done, pending = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
 
-        embedding_time = time.perf_counter() - embedding_start_time
-        logger.info(f"EMBEDDING TIME: {embedding_time}")
+                for task in done:
+                    position, page = task.result()
+                    if page["text"]:
+                        page_count += 1
+                        await add(position, page)
+                    else:
+                        dropped.append(
+                            {
+                                "url": fetches[task],
+                                "reason": page.get(
+                                    "error", page.get("skipped", "empty")
+                                ),
+                            }
+                        )
 
-        relevant_documents = await self.get_most_similar(query_vector, documents, k)
-        mean_score = await self.get_mean_similarity(relevant_documents)
+            for task in pending:
+                dropped.append({"url": fetches[task], "reason": "deadline"})
+            await self.settle([*pending])
+            await asyncio.gather(*embedding_tasks)
+        finally:
+            # Left behind when the retrieval is cancelled or an embedding fails.
+            await self.settle([*fetches, *embedding_tasks])
 
+        # Search order is restored so the ranking does not depend on arrival order.
+        documents = DocumentBatch.concat(pages)
+
+        retrieving = current_span()
+        retrieving.set(pages=page_count, chunks=len(documents), dropped=len(dropped))
+        logger.info(f"SCRAPED PAGES: {page_count} ({len(dropped)} dropped)")
+        logger.info(f"SPLIT COUNT: {len(documents)}")
+        if dedup is not None:
+            # Every dropped chunk is one embedding that was not requested.
+            retrieving.set(dedup_dropped=dedup.dropped, dedup_ratio=dedup.ratio)
+            logger.info(
+                f"DEDUP: dropped {dedup.dropped} of {dedup.seen} chunks "
+                f"({dedup.ratio:.1%}), {dedup.dropped} embeddings saved"
+            )
+        if self.scraper.store is not None:
+            stats = self.scraper.store.stats()
+            retrieving.set(page_store=stats)
+            logger.info(f"PAGE STORE: {stats}")
+
+        if isinstance(query_vector, asyncio.Future):
+            query_vector = await query_vector
+
+        candidates = documents
+        if self.index is not None:
+            with span("index_search"):
+                indexed = self.search_index(query_vector, documents, k)
+            candidates = DocumentBatch.concat([documents, indexed])
+
+        with span("rank", candidates=len(candidates), k=k) as ranking:
+            relevant_documents = await self.get_most_similar(
+                query_vector, candidates, k
+            )
+            mean_score = await self.get_mean_similarity(relevant_documents)
+            ranking.set(score=mean_score)
         logger.info(f"RETRIEVAL SCORE: {mean_score}")
-        return relevant_documents
 
-    async def get_most_similar(self, query_vector, data, k=5) -> list[Document]:
-        """Get most relevant texts based on cosine similarity"""
+        if self.index is not None:
+            with span("index_update", chunks=len(documents)):
+                self.update_index(documents)
+
+        return relevant_documents, dropped
 
-        query_vector = np.array(query_vector).reshape(1, -1)
+    def assemble(self, query_vector, documents: DocumentBatch) -> str:
+        """Prompt context: every chunk joined, or what the context builder
+        picks within its token budget."""
 
-        def compute_cosine_similarity(row):
-            return cosine_similarity(query_vector, row)[0][0]
+        if self.context_builder is None:
+            return "\n".join(documents.texts)
 
-        df: Any = pd.DataFrame(data)
-        df["vector"] = df["vector"].apply(lambda x: np.array(x).reshape(1, -1))
-        df["similarity"] = df["vector"].apply(compute_cosine_similarity)
-        similar = df.nlargest(k, "similarity")[["text", "url", "vector", "similarity"]]
-        similar["vector"] = similar["vector"].apply(lambda x: x[0].tolist())
+        with span("context") as assembling:
+            context, stats = self.context_builder.build(query_vector, documents)
+            assembling.set(**stats)
+        return context
 
-        json_docs = similar.to_dict("records")
+    def search_index(self, query_vector, documents: DocumentBatch, k) -> DocumentBatch:
+        """Chunks accumulated from earlier queries. Pages scraped just now
+        replace their older copies."""
 
-        return [Document(**json_doc) for json_doc in json_docs]
+        fresh_urls = set(documents.source_urls())
+        return self.index.search(query_vector, k, exclude_urls=fresh_urls)  # type: ignore
+
+    def update_index(self, documents: DocumentBatch) -> None:
+        for url in documents.source_urls():
+            self.index.delete_url(url)  # type: ignore
+        if len(documents):
+            self.index.insert(documents.vectors, documents.texts, documents.urls)  # type: ignore
+
+        memory = self.index.memory_bytes()  # type: ignore
+        current_span().set(index_chunks=len(self.index), index_bytes=memory["total"])  # type: ignore
+        logger.info(f"INDEX: {len(self.index)} chunks, {memory['total']} bytes")  # type: ignore
+
+    async def get_most_similar(
+        self, query_vector, data: DocumentBatch, k=5
+    ) -> DocumentBatch:
+        """Get most relevant texts based on cosine similarity"""
+
+        indices, scores = top_k(query_vector, data.vectors, k)
+        return data.take(indices, scores)
 
     async def evaluate_retrieval(
-        self, documents: list[Document], treshold: float
+        self, documents: DocumentBatch, treshold: float
     ) -> bool:
         """Checks if the similarity average is high enough to use document set."""
 
-        if documents:
-            cache_score = sum(
-                doc.similarity for doc in documents if doc.similarity is not None
-            ) / len(documents)
-
+        if len(documents):
+            cache_score = documents.mean_score()
             logger.info(f"CACHE SCORE: {cache_score}")
             return cache_score > treshold
         return False
 
-    async def get_mean_similarity(self, documents: list[Document]) -> float:
-        if documents:
-            score = sum(
-                doc.similarity for doc in documents if doc.similarity is not None
-            ) / len(documents)
-            return score
-        return 0
+    async def get_mean_similarity(self, documents: DocumentBatch) -> float:
+        return documents.mean_score()
@@ -1,48 +1,466 @@
 from abc import ABC, abstractmethod
-import re
-from typing import Any
+import asyncio
+import codecs
+import contextvars
+import json
+import time
+from collections import deque
+from typing import Any, Optional
 
 import aiohttp
-from bs4 import BeautifulSoup
+from retrieval.extract import StreamingTextExtractor, choose_encoding, extract_text
+from retrieval.page_store import PageStore, StoredPage
+from util import logger
+from util.executor import BoundedExecutor
+from util.http_client import HttpClients, open_session
+from util.tracing import current_span, span
+
+
+def failure_reason(error: BaseException) -> str:
+    """Short reason for a page that failed: "timeout" or the exception class.
+    Callers log the full repr."""
+
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return type(error).__name__
 
 
 class Scraper(ABC):
+    def __init__(
+        self,
+        streaming: bool = False,
+        max_bytes: int = 2_000_000,
+        max_chars: int = 200_000,
+        executor: Optional[BoundedExecutor] = None,
+        extraction: str = "full",
+        store: Optional[PageStore] = None,
+    ) -> None:
+        if extraction not in ("full", "main"):
+            raise ValueError(f"Unknown extraction mode: {extraction}")
+
+        self.streaming = streaming
+        self.max_bytes = max_bytes
+        self.max_chars = max_chars
+        self.executor = executor
+        self.extraction = extraction
+        self.store = store
+
     @abstractmethod
     async def fetch(self, url: str) -> dict[str, Any]:
         pass
 
-    async def parse(self, body):
-        """Parses all the text from the html."""
+    async def parse(self, body, encoding: str = "utf-8"):
+        """Parses the text from the html: all of it, or only the main article
+        with extraction="main". With an executor the work runs outside the event
+        loop, receiving raw bytes and returning text."""
+
+        if isinstance(body, str):
+            body, encoding = body.encode("utf-8"), "utf-8"
+
+        args = (body, encoding, self.streaming, self.max_chars, self.extraction)
+        with span("parse", bytes=len(body), mode=self.extraction) as parsing:
+            if self.executor is not None:
+                text = await self.executor.run(extract_text, *args)
+            else:
+                text = extract_text(*args)
+            parsing.set(chars=len(text))
+        return text
+
+    async def lookup(self, url: str) -> Optional[StoredPage]:
+        """The stored copy of the page, if there is a store and it has one.
+        A copy still within the freshness window is counted as a hit."""
+
+        if self.store is None:
+            return None
+
+        page = await asyncio.to_thread(self.store.get, url, self.extraction)
+        if page is not None and self.store.is_fresh(page):
+            self.store.record("fresh")
+            current_span().set(page_store="fresh")
+            await asyncio.to_thread(self.store.touch, page, self.extraction)
+        return page
+
+    async def parse_page(
+        self,
+        url: str,
+        body: bytes,
+        encoding: str = "utf-8",
+        headers: Optional[dict] = None,
+    ) -> str:
+        """Parses the body, reusing the text of an identical stored body, and
+        stores the page with its validators when headers are given."""
+
+        if self.store is None:
+            return await self.parse(body, encoding)
+
+        text = await asyncio.to_thread(self.store.text, body, self.extraction)
+        outcome = "same_content" if text is not None else "miss"
+        self.store.record(outcome)
+        current_span().set(page_store=outcome)
+        if text is None:
+            text = await self.parse(body, encoding)
 
-        soup = BeautifulSoup(body, "html.parser")
-        raw_text = soup.get_text(separator=" ", strip=True)
-        text = re.sub(r"\n{3,}|\s{2,}", "\n", raw_text)
+        if text and headers is not None:
+            await asyncio.to_thread(
+                self.store.put,
+                url,
+                self.extraction,
+                body,
+                text,
+                headers.get("ETag"),
+                headers.get("Last-Modified"),
+            )
+        return text
+
+    async def read(self, response: aiohttp.ClientResponse) -> bytes:
+        """Reads the raw body in chunks, stopping at max_bytes."""
+
+        chunks, received = [], 0
+        async for chunk in response.content.iter_chunked(64 * 1024):
+            chunk = chunk[: self.max_bytes - received]
+            chunks.append(chunk)
+            received += len(chunk)
+            if received >= self.max_bytes:
+                break
+        return b"".join(chunks)
+
+    async def parse_stream(
+        self, response: aiohttp.ClientResponse, chunk_size: int = 64 * 1024
+    ) -> str:
+        """Extracts text while the body downloads, reading at most max_bytes and
+        stopping as soon as max_chars characters were collected. The charset is
+        chosen from the headers and the first chunk."""
+
+        decoder = None
+        extractor = StreamingTextExtractor(max_chars=self.max_chars)
+
+        # The span includes the download, which is interleaved with parsing.
+        with span("parse", mode="stream") as parsing:
+            received = 0
+            async for chunk in response.content.iter_chunked(chunk_size):
+                chunk = chunk[: self.max_bytes - received]
+                received += len(chunk)
+                if decoder is None:
+                    encoding = choose_encoding(response.charset, chunk)
+                    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+                extractor.feed(decoder.decode(chunk))
+                if extractor.done or received >= self.max_bytes:
+                    break
+
+            if decoder is not None:
+                extractor.feed(decoder.decode(b"", final=True))
+            extractor.close()
+            text = extractor.text()
+            parsing.set(bytes=received, chars=len(text))
         return text
 
 
 class ScraperRemote(Scraper):
-    def __init__(self, host: str = "http://lb-scraper/scrape/?url=") -> None:
+    """Scrapes through the remote scraper service.
+
+    A call still running after the `hedge_percentile` of recent latencies gets
+    a duplicate, and whichever answers first is used. Until `hedge_min_samples`
+    calls have completed, `hedge_delay` seconds is used instead. Set
+    hedge_percentile to None to disable hedging.
+
+    With a `batch_url`, urls requested within `batch_window` seconds of each
+    other, by one question or several, are sent together in one POST of
+    {"urls": [...]}, up to `max_batch` per request. The service answers with
+    one NDJSON line per page, {"url", "html"} or {"url", "error"}, as each
+    page finishes, and every fetch returns as soon as its own line has been
+    parsed. Batched calls are not hedged."""
+
+    def __init__(
+        self,
+        host: str = "http://lb-scraper/scrape/?url=",
+        http: Optional[HttpClients] = None,
+        timeout: float = 10,
+        hedge_percentile: Optional[float] = 95,
+        hedge_delay: float = 2.0,
+        hedge_min_samples: int = 20,
+        batch_url: Optional[str] = None,
+        batch_window: float = 0.01,
+        max_batch: int = 32,
+        **options,
+    ) -> None:
+        super().__init__(**options)
         self.host = host
+        self.http = http
+        self.timeout = timeout
+        self.hedge_percentile = hedge_percentile
+        self.hedge_delay = hedge_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.latencies: deque[float] = deque(maxlen=200)
+        self.batch_url = batch_url
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.queued: dict[str, list[asyncio.Future]] = {}
+        self.flush_handle: Optional[asyncio.TimerHandle] = None
+        self.batches: set[asyncio.Task] = set()
+
+    def hedge_after(self) -> float:
+        if len(self.latencies) < self.hedge_min_samples:
+            return self.hedge_delay
+        latencies = sorted(self.latencies)
+        index = int(len(latencies) * self.hedge_percentile / 100)  # type: ignore
+        return latencies[min(index, len(latencies) - 1)]
 
     async def fetch(self, url: str) -> dict[str, Any]:
-        async with aiohttp.ClientSession() as session:
+        stored = await self.lookup(url)
+        if stored is not None and self.store.is_fresh(stored):  # type: ignore
+            return {"url": url, "text": stored.text}
+        if self.batch_url is not None:
+            return await self.batched(url)
+
+        start = time.perf_counter()
+        if self.hedge_percentile is None:
+            page = await self.request(url)
+        else:
+            page = await self.hedged(url)
+        self.latencies.append(time.perf_counter() - start)
+        return page
+
+    async def hedged(self, url: str) -> dict[str, Any]:
+        """Runs the request, adding a duplicate if it is slow. The first
+        success wins; an error only counts once both attempts have failed."""
+
+        attempts = {asyncio.create_task(self.request(url))}
+        done, _ = await asyncio.wait(attempts, timeout=self.hedge_after())
+        if not done:
+            current_span().set(hedged=True)
+            attempts.add(asyncio.create_task(self.request(url)))
+
+        try:
+            pending = attempts
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None and task.result()["text"]:
+                        return task.result()
+            # Every attempt failed or came back empty.
+            failed = next(iter(done))
+            return failed.result()
+        finally:
+            for task in attempts:
+                task.cancel()
+
+    async def request(self, url: str) -> dict[str, Any]:
+        async with open_session(self.http, "scrape") as session:
             query_url = self.host + url
-            async with session.post(query_url) as response:
+            async with session.post(
+                query_url, timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
                 if response.status == 200:
                     body = await response.json()
-                    text = await self.parse(body["html"])
+                    # The service does not relay the origin's validators, so
+                    # pages are stored without them and only reused while fresh.
+                    html = body["html"].encode("utf-8")
+                    text = await self.parse_page(url, html, headers={})
                     if text:
                         return {"url": url, "text": text}
             return {"url": url, "text": None}
 
+    async def batched(self, url: str) -> dict[str, Any]:
+        """Queues the url for the next batch request and waits for its page."""
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        self.queued.setdefault(url, []).append(waiter)
+        if len(self.queued) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.batch_window, self.flush)
+        current_span().set(batched=True)
+        return await waiter
+
+    def flush(self) -> None:
+        """Sends the queued urls as one batch request."""
+
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.queued = self.queued, {}
+        if not batch:
+            return
+
+        # The request serves several questions, so it is traced by none.
+        task = asyncio.create_task(
+            self.request_batch(batch), context=contextvars.Context()
+        )
+        self.batches.add(task)
+        task.add_done_callback(self.batches.discard)
+
+        def abandon(_) -> None:
+            # Every caller got its page, gave up or hit the scrape deadline.
+            if all(waiter.done() for waiters in batch.values() for waiter in waiters):
+                task.cancel()
+
+        for waiters in batch.values():
+            for waiter in waiters:
+                waiter.add_done_callback(abandon)
+
+    async def request_batch(self, batch: dict[str, list[asyncio.Future]]) -> None:
+        """Posts the batch and hands each page to its callers as its line
+        arrives. Lines are parsed while the next ones are still downloading;
+        urls the service never answered get an error."""
+
+        deliveries: list[asyncio.Task] = []
+        error = "missing"
+        try:
+            async with open_session(self.http, "scrape") as session:
+                async with session.post(
+                    self.batch_url,  # type: ignore
+                    json={"urls": list(batch)},
+                    timeout=aiohttp.ClientTimeout(total=self.timeout),
+                ) as response:
+                    response.raise_for_status()
+                    # Pages can be longer than aiohttp's readline limit, so
+                    # lines are split here.
+                    buffer = bytearray()
+                    async for chunk in response.content.iter_any():
+                        buffer += chunk
+                        end = buffer.rfind(b"\n")
+                        if end < 0:
+                            continue
+                        lines = bytes(buffer[:end]).split(b"\n")
+                        del buffer[: end + 1]
+                        for line in lines:
+                            if line.strip():
+                                item = json.loads(line)
+                                deliveries.append(
+                                    asyncio.create_task(self.deliver(item, batch))
+                                )
+            await asyncio.gather(*deliveries)
+        except Exception as e:
+            logger.warning(f"SCRAPER: batch of {len(batch)} failed: {e!r}")
+            error = failure_reason(e)
+        finally:
+            for task in deliveries:
+                task.cancel()
+            for url, waiters in batch.items():
+                for waiter in waiters:
+                    if not waiter.done():
+                        waiter.set_result({"url": url, "text": None, "error": error})
+
+    async def deliver(self, item: dict, batch: dict[str, list[asyncio.Future]]) -> None:
+        url = item["url"]
+        waiters = [waiter for waiter in batch.get(url, []) if not waiter.done()]
+        if not waiters:
+            return
+
+        page: dict[str, Any] = {"url": url, "text": None}
+        try:
+            if "html" in item:
+                html = item["html"].encode("utf-8")
+                page["text"] = await self.parse_page(url, html, headers={}) or None
+            else:
+                page["error"] = item.get("error", "empty")
+        except Exception as e:
+            logger.warning(f"SCRAPER: {url} failed: {e!r}")
+            page["error"] = failure_reason(e)
+
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(page)
+
+
+HTML_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
 
 class ScraperLocal(Scraper):
+    """Scrapes pages directly from their sites.
+
+    Responses are checked on their headers before the body is read: a status
+    other than 200, a Content-Type outside `content_types` or a Content-Length
+    above max_bytes is skipped without downloading it. Other bodies are read
+    up to max_bytes. Skips are counted per reason in `skips`."""
+
+    def __init__(
+        self,
+        http: Optional[HttpClients] = None,
+        content_types: tuple[str, ...] = HTML_TYPES,
+        **options,
+    ) -> None:
+        super().__init__(**options)
+        self.http = http
+        self.content_types = content_types
+        self.skips = {"status": 0, "content_type": 0, "too_large": 0}
+        self.fetched = 0
+        self.truncated = 0
+
+    def gate(self, response: aiohttp.ClientResponse) -> Optional[str]:
+        """Why the response is not worth reading, or None if it is."""
+
+        if response.status != 200:
+            return "status"
+        # Without a Content-Type header the page is read and parsed as html.
+        if (
+            "Content-Type" in response.headers
+            and response.content_type not in self.content_types
+        ):
+            return "content_type"
+        length = response.content_length
+        if length is not None and length > self.max_bytes:
+            return "too_large"
+        return None
+
+    def stats(self) -> dict[str, float]:
+        skipped = sum(self.skips.values())
+        total = self.fetched + skipped
+        return {
+            **self.skips,
+            "fetched": self.fetched,
+            "truncated": self.truncated,
+            "skip_rate": skipped / total if total else 0.0,
+        }
+
     async def fetch(self, url):
-        async with aiohttp.ClientSession() as session:
+        stored = await self.lookup(url)
+        if stored is not None and self.store.is_fresh(stored):  # type: ignore
+            return {"url": url, "text": stored.text}
+
+        headers = {}
+        if stored is not None and stored.etag:
+            headers["If-None-Match"] = stored.etag
+        if stored is not None and stored.last_modified:
+            headers["If-Modified-Since"] = stored.last_modified
+
+        async with open_session(self.http, "scrape") as session:
             async with session.get(
-                url, timeout=aiohttp.ClientTimeout(total=10)
+                url, headers=headers, timeout=aiohttp.ClientTimeout(total=10)
             ) as response:
-                html = await response.text()
-                text = await self.parse(html)
+                current_span().set(status=response.status)
+                if stored is not None and response.status == 304:
+                    self.store.record("revalidated")  # type: ignore
+                    current_span().set(page_store="revalidated")
+                    await asyncio.to_thread(
+                        self.store.revalidated,  # type: ignore
+                        stored,
+                        self.extraction,
+                        response.headers.get("ETag"),
+                        response.headers.get("Last-Modified"),
+                    )
+                    return {"url": url, "text": stored.text}
+
+                reason = self.gate(response)
+                if reason is not None:
+                    self.skips[reason] += 1
+                    current_span().set(skipped=reason)
+                    return {"url": url, "text": None, "skipped": reason}
+                self.fetched += 1
+
+                # The stored copy needs the raw body, so no incremental parsing.
+                incremental = self.streaming and self.extraction == "full"
+                if incremental and self.executor is None and self.store is None:
+                    text = await self.parse_stream(response)
+                else:
+                    body = await self.read(response)
+                    if len(body) >= self.max_bytes:
+                        self.truncated += 1
+                        current_span().set(truncated=True)
+                    encoding = choose_encoding(response.charset, body[:1024])
+                    text = await self.parse_page(url, body, encoding, response.headers)
 
                 return {"url": url, "text": text}
@@ -1,22 +1,14 @@
 from abc import ABC, abstractmethod
 import os
+from typing import Optional
 from urllib.parse import urlencode
 from models.search import SearchResult
-import aiohttp
+from util import logger
+from util.http_client import HttpClients, open_session
+from util.tracing import current_span
 
 from mocks.test_dict import provisional_search_result
 
-GOOGLE_API_URL = os.environ["GOOGLE_API_HOST"]
-GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]
-GOOGLE_CX = os.environ["GOOGLE_CX"]
-GOOGLE_FIELDS = os.environ["GOOGLE_FIELDS"]
-HEADER_ACCEPT_ENCODING = os.environ["HEADER_ACCEPT_ENCODING"]
-HEADER_USER_AGENT = os.environ["HEADER_USER_AGENT"]
-REQUEST_HEADERS = {
-    "Accept-Encoding": HEADER_ACCEPT_ENCODING,
-    "User-Agent": HEADER_USER_AGENT,
-}
-
 
 class Searcher(ABC):
     @abstractmethod
@@ -25,28 +17,43 @@ class Searcher(ABC):
 
 
 class GoogleAPI(Searcher):
-    def __init__(self) -> None:
+    """Google Custom Search. The settings are read from the environment when
+    the searcher is created, so importing the module does not need them."""
+
+    def __init__(
+        self, http: Optional[HttpClients] = None, host: Optional[str] = None
+    ) -> None:
         super().__init__()
+        self.http = http
+        self.host = host if host is not None else os.environ["GOOGLE_API_HOST"]
+        self.key = os.environ["GOOGLE_API_KEY"]
+        self.cx = os.environ["GOOGLE_CX"]
+        self.fields = os.environ["GOOGLE_FIELDS"]
+        self.headers = {
+            "Accept-Encoding": os.environ["HEADER_ACCEPT_ENCODING"],
+            "User-Agent": os.environ["HEADER_USER_AGENT"],
+        }
 
     async def run(self, query: str) -> SearchResult:
         query_params = urlencode(
             {
-                "key": GOOGLE_API_KEY,
-                "fields": GOOGLE_FIELDS,
-                "cx": GOOGLE_CX,
+                "key": self.key,
+                "fields": self.fields,
+                "cx": self.cx,
                 "q": query,
             }
         )
-        url = f"{GOOGLE_API_URL}{query_params}"
+        url = f"{self.host}{query_params}"
 
-        async with aiohttp.ClientSession() as session:
+        async with open_session(self.http, "search") as session:
             async with session.get(
                 url,
-                headers=REQUEST_HEADERS,
+                headers=self.headers,
             ) as response:
                 r = await response.json()
                 try:
                     return SearchResult(**r)
                 except Exception as e:
-                    print("SEARCHER", e)
-                    return SearchResult(**provisional_search_result)
+                    logger.warning(f"SEARCHER: unexpected response, using mocks: {e}")
+                    current_span().set(error=repr(e), fallback="mocks")
+                    return SearchResult(**provisional_search_result, fallback=True)
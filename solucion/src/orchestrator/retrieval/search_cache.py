@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from typing import Callable, Optional
+
+from models.search import SearchResult
+from retrieval.search import Searcher
+from util import logger, TTLCache
+from util.tracing import current_span
+
+PUNCTUATION = re.compile(r"[^\w\s]+")
+WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """Cache key of a query: case, accents, punctuation and spacing removed,
+    so "¿Qué es Python?" and "que es  python" share results."""
+
+    decomposed = unicodedata.normalize("NFKD", query.casefold())
+    text = "".join(char for char in decomposed if not unicodedata.combining(char))
+    text = PUNCTUATION.sub(" ", text)
+    return WHITESPACE.sub(" ", text).strip()
+
+
+class CachedSearcher(Searcher):
+    """Wraps a Searcher with a TTL cache keyed on the normalized query.
+
+    Results younger than `ttl` are served as they are. Results older than that
+    but within `stale_ttl` more seconds are served immediately while a single
+    background search refreshes them. Concurrent misses for the same key share
+    one search. With a `path`, results are also kept in SQLite so they survive
+    restarts; the in-memory cache stays the first level."""
+
+    def __init__(
+        self,
+        searcher: Searcher,
+        ttl: float = 60 * 60,
+        stale_ttl: float = 24 * 60 * 60,
+        max_size: int = 512,
+        path: Optional[str] = None,
+        max_disk_entries: int = 10_000,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.searcher = searcher
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.entries = TTLCache(max_size=max_size, ttl=ttl + stale_ttl, clock=clock)
+        self.max_disk_entries = max_disk_entries
+        self.pending: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        self._connection: Optional[sqlite3.Connection] = None
+        if path is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._connection = sqlite3.connect(path)
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS searches (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    fetched_at REAL NOT NULL
+                )
+                """)
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS searches_fetched_at ON searches (fetched_at)"
+            )
+            self._connection.commit()
+
+    async def run(self, query: str) -> SearchResult:
+        key = normalize_query(query)
+        entry = self._get(key)
+
+        if entry is not None:
+            fetched_at, result = entry
+            age = self.clock() - fetched_at
+            if age <= self.ttl:
+                self.hits += 1
+                current_span().set(search_cache="hit", age=age)
+                return result
+            if age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh(key, query)
+                current_span().set(search_cache="stale", age=age)
+                return result
+
+        self.misses += 1
+        current_span().set(search_cache="miss")
+        # Shielded so a cancelled caller does not cancel a search others await.
+        return await asyncio.shield(self._refresh(key, query))
+
+    def stats(self) -> dict[str, float]:
+        total = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.stale_hits) / total if total else 0.0,
+        }
+
+    def close(self) -> None:
+        for task in self.pending.values():
+            task.cancel()
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _refresh(self, key: str, query: str) -> asyncio.Task:
+        """Starts a search for the key unless one is already running."""
+
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.create_task(self._search(key, query))
+            self.pending[key] = task
+            task.add_done_callback(lambda _: self.pending.pop(key, None))
+            task.add_done_callback(self._log_failure)
+        return task
+
+    async def _search(self, key: str, query: str) -> SearchResult:
+        result = await self.searcher.run(query)
+        # Mocks stand in for a failed search; stored, they would be served
+        # in place of real results until they expired.
+        if not result.fallback:
+            self._put(key, result)
+        return result
+
+    @staticmethod
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"SEARCH CACHE: refresh failed: {task.exception()!r}")
+
+    def _get(self, key: str) -> Optional[tuple[float, SearchResult]]:
+        entry = self.entries.get(key)
+        if entry is not None or self._connection is None:
+            return entry
+
+        row = self._connection.execute(
+            "SELECT fetched_at, result FROM searches WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or self.clock() - row[0] > self.ttl + self.stale_ttl:
+            return None
+
+        entry = (row[0], SearchResult(**json.loads(row[1])))
+        self.entries.set(key, entry)
+        return entry
+
+    def _put(self, key: str, result: SearchResult) -> None:
+        fetched_at = self.clock()
+        self.entries.set(key, (fetched_at, result))
+        if self._connection is None:
+            return
+
+        self._connection.execute(
+            "INSERT OR REPLACE INTO searches (key, result, fetched_at) VALUES (?, ?, ?)",
+            (key, json.dumps(result.model_dump()), fetched_at),
+        )
+        self._connection.execute(
+            "DELETE FROM searches WHERE key IN ("
+            "SELECT key FROM searches ORDER BY fetched_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,),
+        )
+        self._connection.commit()
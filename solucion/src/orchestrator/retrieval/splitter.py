@@ -1,13 +1,35 @@
 from abc import ABC, abstractmethod
+import asyncio
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
 import numpy as np
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 
+Span = tuple[int, int]
+
 
 class Splitter(ABC):
     @abstractmethod
     async def split(self, text: str) -> list[str]:
         pass
 
+    async def split_many(self, texts: list[str]) -> list[list[str]]:
+        return [await self.split(text) for text in texts]
+
+    async def split_spans(self, text: str) -> list[Span]:
+        """Chunks as (start, end) offsets into the text. Chunks are located in
+        order, which is exact for splitters that only cut and strip."""
+
+        spans, position = [], 0
+        for chunk in await self.split(text):
+            start = text.find(chunk, position)
+            if start < 0:
+                start = text.find(chunk)
+            spans.append((start, start + len(chunk)))
+            position = start + 1
+        return spans
+
 
 class LangChainSplitter(Splitter):
     def __init__(self, chunk_size, chunk_overlap, length_function) -> None:
@@ -27,3 +49,172 @@ class LangChainSplitter(Splitter):
         chunks = text_splitter.split_text(text)
 
         return chunks
+
+
+class RecursiveSplitter(Splitter):
+    """Native port of LangChain's RecursiveCharacterTextSplitter.
+
+    Produces the same chunks for the same separators, chunk_size and
+    chunk_overlap (separators kept, whitespace stripped) when lengths are
+    measured with len; a custom length_function is applied to each piece with
+    its separator, where LangChain measures them apart. It works on
+    (start, end) offsets into the page text. Strings are only sliced out when
+    asked for. Piece bounds are computed with NumPy, and merging jumps from
+    chunk boundary to chunk boundary by bisecting the running length instead
+    of walking every piece. Splitting runs in a worker thread, which keeps the
+    event loop serving other tasks; it holds the GIL, so more threads would
+    not split pages in parallel."""
+
+    def __init__(
+        self,
+        chunk_size: int = 400,
+        chunk_overlap: int = 50,
+        length_function: Callable[[str], int] = len,
+        separators: Optional[list[str]] = None,
+        max_workers: int = 1,
+    ) -> None:
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.length_function = length_function
+        self.separators = separators or ["\n\n", "\n", " ", ""]
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def spans(self, text: str) -> list[Span]:
+        """Returns the chunks of the text as (start, end) offsets."""
+
+        return self._split(text, 0, len(text), self.separators)
+
+    async def split_spans(self, text: str) -> list[Span]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.spans, text)
+
+    async def split(self, text: str) -> list[str]:
+        return [text[start:end] for start, end in await self.split_spans(text)]
+
+    async def split_many_spans(self, texts: list[str]) -> list[list[Span]]:
+        """Splits many pages, one after another in the worker thread."""
+
+        return list(await asyncio.gather(*(self.split_spans(text) for text in texts)))
+
+    async def split_many(self, texts: list[str]) -> list[list[str]]:
+        spans = await self.split_many_spans(texts)
+        return [
+            [text[start:end] for start, end in page_spans]
+            for text, page_spans in zip(texts, spans)
+        ]
+
+    def _lengths(self, text: str, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        if self.length_function is len:
+            return ends - starts
+        return np.array(
+            [self.length_function(text[a:b]) for a, b in zip(starts, ends)],
+            dtype=np.int64,
+        )
+
+    def _split(
+        self, text: str, start: int, end: int, separators: list[str]
+    ) -> list[Span]:
+        separator = separators[-1]
+        new_separators: list[str] = []
+        for i, candidate in enumerate(separators):
+            if candidate == "":
+                separator = candidate
+                break
+            if text.find(candidate, start, end) != -1:
+                separator = candidate
+                new_separators = separators[i + 1 :]
+                break
+
+        starts, ends = self._pieces(text, start, end, separator)
+        lengths = self._lengths(text, starts, ends)
+
+        chunks: list[Span] = []
+        good = 0
+        for i in np.flatnonzero(lengths >= self.chunk_size).tolist():
+            # Pieces good to i are small enough to be merged as they are.
+            if good < i:
+                chunks.extend(
+                    self._merge(text, starts[good:i], ends[good:i], lengths[good:i])
+                )
+            if not new_separators:
+                chunks.append((int(starts[i]), int(ends[i])))
+            else:
+                chunks.extend(
+                    self._split(text, int(starts[i]), int(ends[i]), new_separators)
+                )
+            good = i + 1
+
+        if good < len(starts):
+            chunks.extend(self._merge(text, starts[good:], ends[good:], lengths[good:]))
+        return chunks
+
+    @staticmethod
+    def _pieces(
+        text: str, start: int, end: int, separator: str
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Cuts text[start:end] before every separator, which stays attached to
+        the piece that follows it. Returns the starts and ends of the pieces;
+        empty pieces are dropped."""
+
+        if not separator:
+            starts = np.arange(start, end, dtype=np.int64)
+            return starts, starts + 1
+
+        parts = text[start:end].split(separator)
+        lengths = np.fromiter(map(len, parts), dtype=np.int64, count=len(parts))
+        lengths[1:] += len(separator)
+        bounds = np.empty(len(parts) + 1, dtype=np.int64)
+        bounds[0] = start
+        np.cumsum(lengths, out=bounds[1:])
+        bounds[1:] += start
+        kept = lengths > 0
+        return bounds[:-1][kept], bounds[1:][kept]
+
+    def _merge(
+        self, text: str, starts: np.ndarray, ends: np.ndarray, lengths: np.ndarray
+    ) -> list[Span]:
+        """Packs consecutive pieces into chunks of at most chunk_size, carrying
+        up to chunk_overlap of the previous chunk into the next one."""
+
+        chunk_size, chunk_overlap = self.chunk_size, self.chunk_overlap
+        count = len(lengths)
+        # totals[i] is the length of the pieces before piece i.
+        totals = [0] + np.cumsum(lengths).tolist()
+        chunks: list[Span] = []
+
+        # The chunk being built starts at piece `first`; pieces before `position`
+        # have been added to it.
+        first, position = 0, 0
+        while True:
+            # The first piece that does not fit closes the chunk. A piece on
+            # its own always fits.
+            lo = max(position, first + 1) + 1
+            i = bisect_right(totals, totals[first] + chunk_size, lo) - 1
+            if i >= count:
+                break
+
+            chunk = self._strip(text, int(starts[first]), int(ends[i - 1]))
+            if chunk is not None:
+                chunks.append(chunk)
+            # Drop pieces until at most chunk_overlap is carried over and the
+            # closing piece fits.
+            floor = max(totals[i] - chunk_overlap, totals[i + 1] - chunk_size)
+            first = min(bisect_left(totals, floor, first, i), i)
+            position = i + 1
+
+        if first < count:
+            chunk = self._strip(text, int(starts[first]), int(ends[-1]))
+            if chunk is not None:
+                chunks.append(chunk)
+        return chunks
+
+    @staticmethod
+    def _strip(text: str, start: int, end: int) -> Optional[Span]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
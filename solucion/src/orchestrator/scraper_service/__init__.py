@@ -0,0 +1 @@
+from scraper_service.service import ScraperService
@@ -0,0 +1,81 @@
+"""Runs the scraper service as several instances behind a round-robin balancer.
+
+Each instance is a process with its own fetchers and parser pool; all of them
+share the page cache. The balancer listens on --port and the instances on the
+ports after it. Run from src/orchestrator:
+
+    python -m scraper_service --port 8080 --instances 3 --workers 2
+"""
+
+import argparse
+import multiprocessing
+import time
+import urllib.request
+
+from aiohttp import web
+
+from scraper_service.balancer import RoundRobinBalancer
+from scraper_service.service import serve
+from util import logger
+
+
+def wait_ready(url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(url, timeout=1):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--instances", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--per-domain", type=int, default=4)
+    parser.add_argument("--max-queue", type=int, default=256)
+    parser.add_argument("--cache", default=".cache/scraper-service.sqlite3")
+    args = parser.parse_args()
+
+    options = {
+        "workers": args.workers,
+        "concurrency": args.concurrency,
+        "per_domain": args.per_domain,
+        "max_queue": args.max_queue,
+        "cache_path": args.cache,
+    }
+    ports = [args.port + 1 + i for i in range(args.instances)]
+    # Spawned, not forked: each instance starts its own loop and parser pool.
+    context = multiprocessing.get_context("spawn")
+    instances = [
+        context.Process(target=serve, args=(args.host, port, options)) for port in ports
+    ]
+    for instance in instances:
+        instance.start()
+
+    try:
+        backends = [f"http://{args.host}:{port}" for port in ports]
+        for backend in backends:
+            wait_ready(f"{backend}/health")
+        logger.info(f"SCRAPER SERVICE: balancing {backends} on port {args.port}")
+        web.run_app(
+            RoundRobinBalancer(backends).application(),
+            host=args.host,
+            port=args.port,
+            print=None,
+        )
+    finally:
+        for instance in instances:
+            instance.terminate()
+        for instance in instances:
+            instance.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import itertools
+from typing import Optional
+
+import aiohttp
+from aiohttp import web
+from yarl import URL
+
+
+class RoundRobinBalancer:
+    """Reverse proxy that sends each request to the next backend in turn.
+
+    A backend that refuses the connection or answers 503 is skipped and the
+    request goes to the next one, until every backend was tried. Responses
+    are streamed through, so batch lines reach the client as they arrive."""
+
+    def __init__(self, backends: list[str], timeout: float = 60) -> None:
+        self.backends = backends
+        self.timeout = timeout
+        self.order = itertools.cycle(backends)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def start(self, app: web.Application) -> None:
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=0),
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            auto_decompress=False,
+        )
+
+    async def stop(self, app: web.Application) -> None:
+        if self.session is not None:
+            await self.session.close()
+
+    async def forward(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        headers = {
+            name: request.headers[name]
+            for name in ("Content-Type", "Accept", "Accept-Encoding")
+            if name in request.headers
+        }
+
+        error = "no backend"
+        for attempt in range(len(self.backends)):
+            backend = next(self.order)
+            # raw_path keeps the query exactly as the client sent it.
+            url = URL(backend + request.raw_path, encoded=True)
+            try:
+                upstream = await self.session.request(  # type: ignore
+                    request.method, url, data=body, headers=headers
+                )
+            except aiohttp.ClientConnectionError as e:
+                error = repr(e)
+                continue
+
+            async with upstream:
+                if upstream.status == 503 and attempt < len(self.backends) - 1:
+                    error = "overloaded"
+                    continue
+
+                response = web.StreamResponse(
+                    status=upstream.status,
+                    headers={
+                        name: upstream.headers[name]
+                        for name in ("Content-Type", "Content-Encoding")
+                        if name in upstream.headers
+                    },
+                )
+                await response.prepare(request)
+                try:
+                    async for chunk in upstream.content.iter_any():
+                        await response.write(chunk)
+                    await response.write_eof()
+                except ConnectionResetError:
+                    # The client stopped reading; the backend is let go.
+                    pass
+                return response
+
+        return web.json_response({"error": error}, status=502)
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self.forward)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
@@ -0,0 +1,31 @@
+import asyncio
+import json
+from typing import Any, Awaitable, Callable
+
+from aiohttp import web
+
+
+async def stream_batch(
+    request: web.Request, item: Callable[[str], Awaitable[dict[str, Any]]]
+) -> web.StreamResponse:
+    """Answers a batch request, {"urls": [...]}, with one NDJSON line per url
+    in the order `item` finishes them. `item` returns {"url", "html"} or
+    {"url", "error"} and should not raise."""
+
+    urls = (await request.json())["urls"]
+    response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await response.prepare(request)
+
+    tasks = [asyncio.create_task(item(url)) for url in urls]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            line = json.dumps(await finished) + "\n"
+            await response.write(line.encode("utf-8"))
+        await response.write_eof()
+    except ConnectionResetError:
+        # The client stopped reading, e.g. at its scrape deadline.
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+    return response
@@ -0,0 +1,241 @@
+import asyncio
+from collections import deque
+from typing import Any, Optional
+from urllib.parse import unquote, urlsplit
+
+from aiohttp import web
+
+from retrieval.page_store import PageStore
+from retrieval.scraper import ScraperLocal, failure_reason
+from scraper_service.batch import stream_batch
+from scraper_service.worker import clean_html
+from util import logger
+from util.executor import BoundedExecutor
+from util.http_client import HttpClients
+
+
+class Overloaded(Exception):
+    """The job queue is full."""
+
+
+class ScrapeFailed(Exception):
+    """The page was fetched but skipped or came back empty."""
+
+
+class HtmlScraper(ScraperLocal):
+    """ScraperLocal whose parsed text is the cleaned html, so the page store
+    and the executor work unchanged for the service."""
+
+    async def parse(self, body, encoding: str = "utf-8"):
+        if isinstance(body, str):
+            body, encoding = body.encode("utf-8"), "utf-8"
+        if self.executor is not None:
+            return await self.executor.run(clean_html, body, encoding)
+        return clean_html(body, encoding)
+
+
+def target_url(request: web.Request) -> str:
+    """The url to scrape. ScraperRemote appends it to "?url=" unquoted, so
+    everything after "url=" is taken, including its own query string."""
+
+    raw = request.rel_url.raw_query_string
+    if not raw.startswith("url="):
+        return request.query.get("url", "")
+    url = raw[len("url=") :]
+    return url if "://" in url else unquote(url)
+
+
+class ScraperService:
+    """HTTP service behind lb-scraper that scrapes pages for ScraperRemote.
+
+    POST /scrape/?url=<url> answers {"html"} with the page decoded and
+    stripped of scripts, styles and comments. POST /scrape/batch takes
+    {"urls": [...]} and streams one NDJSON line per url, {"url", "html"} or
+    {"url", "error"}, as each page finishes.
+
+    Urls wait in a queue of at most `max_queue` jobs; a request that does not
+    fit is refused with 503, which the balancer passes on to another instance.
+    `concurrency` fetchers take jobs from the queue, at most `per_domain` of
+    them on the same host. A job whose host is at its limit is parked until a
+    fetcher on that host is done, so the others move on to other hosts.
+    Decoding runs in a pool of `workers` processes.
+    Pages are kept in a PageStore at `cache_path` that several instances can
+    share. Concurrent requests for the same url share one job."""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        concurrency: int = 32,
+        per_domain: int = 4,
+        max_queue: int = 256,
+        max_bytes: int = 2_000_000,
+        cache_path: str = ".cache/scraper-service.sqlite3",
+        freshness: float = 15 * 60,
+    ) -> None:
+        self.workers = workers
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.max_queue = max_queue
+        self.max_bytes = max_bytes
+        self.cache_path = cache_path
+        self.freshness = freshness
+
+        self.jobs: dict[str, asyncio.Future] = {}
+        # Fetchers running and jobs parked per host; idle hosts are removed.
+        self.active: dict[str, int] = {}
+        self.parked: dict[str, deque[tuple[str, asyncio.Future]]] = {}
+        self.counts = {"served": 0, "failed": 0, "overloaded": 0}
+        self.queue: Optional[asyncio.Queue] = None
+        self.fetchers: list[asyncio.Task] = []
+
+    async def start(self, app: web.Application) -> None:
+        self.http = HttpClients()
+        self.http.configure(
+            "scrape", limit=self.concurrency, limit_per_host=self.per_domain
+        )
+        self.executor = BoundedExecutor(
+            kind="process", max_workers=self.workers, max_pending=self.workers * 4
+        )
+        self.store = PageStore(path=self.cache_path, freshness=self.freshness)
+        self.scraper = HtmlScraper(
+            http=self.http,
+            max_bytes=self.max_bytes,
+            executor=self.executor,
+            store=self.store,
+        )
+        self.queue = asyncio.Queue()
+        self.fetchers = [
+            asyncio.create_task(self.fetcher()) for _ in range(self.concurrency)
+        ]
+
+    async def stop(self, app: web.Application) -> None:
+        for task in self.fetchers:
+            task.cancel()
+        await asyncio.gather(*self.fetchers, return_exceptions=True)
+        await self.http.close()
+        self.executor.shutdown()
+        self.store.close()
+
+    def submit(self, url: str) -> asyncio.Future:
+        """The job of the url: the running one, or a new one if it fits."""
+
+        job = self.jobs.get(url)
+        if job is not None:
+            return job
+
+        if self.queued() >= self.max_queue:
+            self.counts["overloaded"] += 1
+            raise Overloaded(url)
+        job = asyncio.get_running_loop().create_future()
+        self.jobs[url] = job
+        job.add_done_callback(lambda _: self.finished(url, job))
+        self.queue.put_nowait((url, job))  # type: ignore
+        return job
+
+    def finished(self, url: str, job: asyncio.Future) -> None:
+        if self.jobs.get(url) is job:
+            del self.jobs[url]
+        if not job.cancelled() and job.exception() is not None:
+            self.counts["failed"] += 1
+        else:
+            self.counts["served"] += 1
+
+    def queued(self) -> int:
+        if self.queue is None:
+            return 0
+        return self.queue.qsize() + sum(len(jobs) for jobs in self.parked.values())
+
+    async def fetcher(self) -> None:
+        while True:
+            url, job = await self.queue.get()  # type: ignore
+            host = urlsplit(url).hostname or ""
+            if self.active.get(host, 0) >= self.per_domain:
+                self.parked.setdefault(host, deque()).append((url, job))
+                continue
+
+            self.active[host] = self.active.get(host, 0) + 1
+            try:
+                while True:
+                    await self.run(url, job)
+                    # The slot goes to the next job parked on the same host.
+                    parked = self.parked.get(host)
+                    if not parked:
+                        break
+                    url, job = parked.popleft()
+                    if not parked:
+                        del self.parked[host]
+            finally:
+                self.active[host] -= 1
+                if not self.active[host]:
+                    del self.active[host]
+
+    async def run(self, url: str, job: asyncio.Future) -> None:
+        try:
+            page = await self.scraper.fetch(url)
+            if not page["text"]:
+                raise ScrapeFailed(page.get("skipped", "empty"))
+            job.set_result(page["text"])
+        except Exception as e:
+            job.set_exception(e)
+
+    async def html(self, url: str) -> str:
+        # Shielded so a client that disconnects does not cancel a shared job.
+        return await asyncio.shield(self.submit(url))
+
+    async def scrape(self, request: web.Request) -> web.Response:
+        url = target_url(request)
+        if not url:
+            return web.json_response({"error": "missing url"}, status=400)
+        try:
+            return web.json_response({"html": await self.html(url)})
+        except Overloaded:
+            return web.json_response({"error": "overloaded"}, status=503)
+        except Exception as e:
+            logger.warning(f"SCRAPER SERVICE: {url} failed: {e!r}")
+            return web.json_response({"error": failure_reason(e)}, status=502)
+
+    async def item(self, url: str) -> dict[str, Any]:
+        try:
+            return {"url": url, "html": await self.html(url)}
+        except Overloaded:
+            return {"url": url, "error": "overloaded"}
+        except Exception as e:
+            logger.warning(f"SCRAPER SERVICE: {url} failed: {e!r}")
+            return {"url": url, "error": failure_reason(e)}
+
+    async def batch(self, request: web.Request) -> web.StreamResponse:
+        return await stream_batch(request, self.item)
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({"status": "ok"})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response(
+            {
+                **self.counts,
+                "queued": self.queued(),
+                "jobs": len(self.jobs),
+                "scraper": self.scraper.stats(),
+                "cache": self.store.stats(),
+            }
+        )
+
+    def application(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/scrape/", self.scrape)
+        app.router.add_post("/scrape/batch", self.batch)
+        app.router.add_get("/health", self.health)
+        app.router.add_get("/stats", self.stats)
+        app.on_startup.append(self.start)
+        app.on_cleanup.append(self.stop)
+        return app
+
+
+def serve(host: str, port: int, options: dict[str, Any]) -> None:
+    """Runs one instance until it is interrupted. Module level so that it can
+    be the target of a spawned process."""
+
+    logger.info(f"SCRAPER SERVICE: instance on {host}:{port}")
+    web.run_app(
+        ScraperService(**options).application(), host=host, port=port, print=None
+    )
@@ -0,0 +1,20 @@
+import re
+from typing import Optional
+
+from retrieval.extract import choose_encoding
+
+# Blocks the client drops when it extracts text, so they are not sent.
+DROPPED_BLOCKS = re.compile(
+    r"<(script|style|noscript|template|svg)\b.*?</\1\s*>|<!--.*?-->",
+    re.IGNORECASE | re.DOTALL,
+)
+BLANK_LINES = re.compile(r"\n\s*\n+")
+
+
+def clean_html(body: bytes, charset: Optional[str] = None) -> str:
+    """Decodes a raw body and strips scripts, styles and comments. Module level
+    so that it can be shipped to a worker process."""
+
+    encoding = choose_encoding(charset, body[:1024])
+    html = body.decode(encoding, errors="replace")
+    return BLANK_LINES.sub("\n", DROPPED_BLOCKS.sub("", html))
@@ -1 +1,2 @@
 from util.logger import logger
+from util.cache import TTLCache
@@ -0,0 +1,66 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class TTLCache:
+    """Bounded in-memory mapping with LRU eviction and optional expiry."""
+
+    def __init__(
+        self,
+        max_size: int = 128,
+        ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        self.purge()
+        return len(self._data)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def _expired(self, stored_at: float) -> bool:
+        return self.ttl is not None and self.clock() - stored_at > self.ttl
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Returns the value and marks it as recently used."""
+
+        item = self._data.get(key)
+        if item is None:
+            return default
+        if self._expired(item[0]):
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (self.clock(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_size:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self._data.pop(key, None)
+        return default if item is None else item[1]
+
+    def purge(self) -> None:
+        """Drops every expired entry."""
+
+        if self.ttl is None:
+            return
+        for key in [
+            k for k, (stored_at, _) in self._data.items() if self._expired(stored_at)
+        ]:
+            del self._data[key]
+
+    def items(self) -> list[tuple[Hashable, Any]]:
+        """Live entries, least recently used first. Does not touch recency."""
+
+        self.purge()
+        return [(key, value) for key, (_, value) in self._data.items()]
@@ -0,0 +1,78 @@
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+import aiohttp
+
+
+class HttpClients:
+    """Registry of long-lived aiohttp sessions.
+
+    Every named client owns its own connection pool, so keep-alive connections,
+    resolved hosts and TLS sessions survive between requests. Sessions are
+    created lazily inside the running event loop and closed together."""
+
+    defaults: dict[str, Any] = {
+        "limit": 100,
+        "limit_per_host": 8,
+        "ttl_dns_cache": 300,
+        "keepalive_timeout": 30.0,
+        "timeout": None,
+        "headers": None,
+    }
+
+    def __init__(self, **options: Any) -> None:
+        self.options = {**self.defaults, **options}
+        self.clients: dict[str, dict[str, Any]] = {}
+        self.sessions: dict[str, aiohttp.ClientSession] = {}
+
+    def configure(self, name: str, **options: Any) -> None:
+        """Overrides the pool settings of one named client before first use."""
+
+        if name in self.sessions:
+            raise RuntimeError(f"HTTP client {name!r} is already open")
+        self.clients[name] = options
+
+    def session(self, name: str = "default") -> aiohttp.ClientSession:
+        session = self.sessions.get(name)
+        if session is None or session.closed:
+            options = {**self.options, **self.clients.get(name, {})}
+            connector = aiohttp.TCPConnector(
+                limit=options["limit"],
+                limit_per_host=options["limit_per_host"],
+                use_dns_cache=True,
+                ttl_dns_cache=options["ttl_dns_cache"],
+                keepalive_timeout=options["keepalive_timeout"],
+                enable_cleanup_closed=True,
+            )
+            timeout = options["timeout"]
+            session = aiohttp.ClientSession(
+                connector=connector,
+                headers=options["headers"],
+                timeout=aiohttp.ClientTimeout(total=timeout) if timeout else None,
+            )
+            self.sessions[name] = session
+        return session
+
+    async def close(self) -> None:
+        sessions, self.sessions = self.sessions, {}
+        for session in sessions.values():
+            await session.close()
+
+    async def __aenter__(self) -> "HttpClients":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+@asynccontextmanager
+async def open_session(
+    clients: Optional[HttpClients], name: str = "default"
+) -> AsyncIterator[aiohttp.ClientSession]:
+    """Yields the shared session of a client, or a throwaway one without registry."""
+
+    if clients is None:
+        async with aiohttp.ClientSession() as session:
+            yield session
+    else:
+        yield clients.session(name)
@@ -0,0 +1,4 @@
+def estimate_tokens(text: str) -> int:
+    """Rough token count for OpenAI models, about four characters per token."""
+
+    return len(text) // 4 + 1
@@ -0,0 +1,191 @@
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator, Optional
+
+
+class Span:
+    """One timed operation. Times are seconds since the tracer started."""
+
+    __slots__ = ("id", "parent", "name", "start", "end", "track", "attributes")
+
+    def __init__(
+        self, id: int, parent: Optional[int], name: str, start: float, track: int
+    ) -> None:
+        self.id = id
+        self.parent = parent
+        self.name = name
+        self.start = start
+        self.end: Optional[float] = None
+        self.track = track
+        self.attributes: dict[str, Any] = {}
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def add(self, name: str, amount: float = 1) -> None:
+        self.attributes[name] = self.attributes.get(name, 0) + amount
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "parent": self.parent,
+            "name": self.name,
+            "start": self.start,
+            "end": self.end,
+            "track": self.track,
+            "attributes": self.attributes,
+        }
+
+
+class _NullSpan(Span):
+    """Span handed out when no tracer is active. Attributes are dropped."""
+
+    def __init__(self) -> None:
+        super().__init__(0, None, "", 0.0, 0)
+
+    def set(self, **attributes: Any) -> None:
+        pass
+
+    def add(self, name: str, amount: float = 1) -> None:
+        pass
+
+
+NULL_SPAN = _NullSpan()
+_tracer: contextvars.ContextVar[Optional["Tracer"]] = contextvars.ContextVar(
+    "tracer", default=None
+)
+_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar(
+    "span", default=None
+)
+
+
+class Tracer:
+    """Collects the spans of one question.
+
+    The tracer and the open span live in context variables, so tasks created
+    inside a span inherit it as their parent and code deep in the pipeline can
+    open spans with the module-level `span` without receiving the tracer. Each
+    asyncio task gets its own track, which keeps the Chrome trace properly
+    nested when spans overlap."""
+
+    def __init__(self) -> None:
+        self.origin = time.perf_counter()
+        self.spans: list[Span] = []
+        self._ids = itertools.count(1)
+        self._tracks: dict[int, int] = {}
+
+    @contextmanager
+    def activate(self) -> Iterator["Tracer"]:
+        token = _tracer.set(self)
+        try:
+            yield self
+        finally:
+            _tracer.reset(token)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        parent = _span.get()
+        task = asyncio.current_task() if _in_loop() else None
+        track = self._tracks.setdefault(id(task), len(self._tracks))
+
+        current = Span(
+            next(self._ids),
+            parent.id if parent is not None else None,
+            name,
+            time.perf_counter() - self.origin,
+            track,
+        )
+        current.set(**attributes)
+        self.spans.append(current)
+
+        token = _span.set(current)
+        try:
+            yield current
+        except BaseException as e:
+            current.set(error=repr(e))
+            raise
+        finally:
+            current.end = time.perf_counter() - self.origin
+            _span.reset(token)
+
+    def to_dict(self) -> list[dict[str, Any]]:
+        return [span.to_dict() for span in self.spans]
+
+    def summary(self) -> str:
+        """One entry per span name: active window, summed time and count."""
+
+        stages: dict[str, dict[str, float]] = {}
+        for span in self.spans:
+            end = span.end if span.end is not None else span.start
+            stage = stages.setdefault(
+                span.name,
+                {"first": span.start, "last": end, "busy": 0.0, "count": 0},
+            )
+            stage["first"] = min(stage["first"], span.start)
+            stage["last"] = max(stage["last"], end)
+            stage["busy"] += end - span.start
+            stage["count"] += 1
+
+        total = time.perf_counter() - self.origin
+        parts = [
+            f"{name} {t['first']:.3f}-{t['last']:.3f}s "
+            f"(busy {t['busy']:.3f}s over {int(t['count'])} calls)"
+            for name, t in stages.items()
+        ]
+        return f"total {total:.3f}s; " + "; ".join(parts)
+
+
+def _in_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Opens a span on the active tracer, or does nothing if there is none."""
+
+    tracer = _tracer.get()
+    if tracer is None:
+        yield NULL_SPAN
+        return
+    with tracer.span(name, **attributes) as current:
+        yield current
+
+
+def current_span() -> Span:
+    """The innermost open span, to attach attributes to it."""
+
+    return _span.get() or NULL_SPAN
+
+
+def chrome_trace(spans: list[dict[str, Any]]) -> dict[str, Any]:
+    """Converts spans, as returned by Tracer.to_dict, to the Chrome trace-event
+    format read by chrome://tracing and Perfetto."""
+
+    events = [
+        {
+            "name": span["name"],
+            "ph": "X",
+            "ts": span["start"] * 1e6,
+            "dur": ((span["end"] or span["start"]) - span["start"]) * 1e6,
+            "pid": 1,
+            "tid": span["track"],
+            "args": span["attributes"],
+        }
+        for span in spans
+    ]
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def write_chrome_trace(spans: list[dict[str, Any]], path: str) -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as file:
+        json.dump(chrome_trace(spans), file, default=str)